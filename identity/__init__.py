@@ -2,11 +2,12 @@
 
 from .identity_manager import IdentityManager
 from .models import AgentIdentity
-from .tools import register_recall_id, discovered_locally
+from .tools import register_recall_id, discovered_locally, publish_identities
 
 __all__ = [
     "IdentityManager",
     "AgentIdentity",
     "register_recall_id",
-    "discovered_locally"
+    "discovered_locally",
+    "publish_identities"
 ]
\ No newline at end of file
@@ -3,9 +3,10 @@ DID (Decentralized Identifier) generator module
 Used to generate and validate DID identifiers for AgentMessage
 """
 
-import uuid
+import os
+import re
+import time
 import hashlib
-from datetime import datetime
 from typing import Optional
 
 class DIDGenerator:
@@ -16,32 +17,23 @@ class DIDGenerator:
     
     def __init__(self, method: str = "agentmessage"):
         self.method = method
+        self._local_prefix = f"did:{method}:local:"
+        self._did_re = re.compile(rf"did:{re.escape(method)}:(?:local|remote):[0-9a-f]{{32}}")
     
     def generate_did(self, agent_name: str, endpoint: str = None) -> str:
         """Generate DID
         
         format: did:agentmessage:{network}:{identifier}
         """
-        # Generate unique identifier
-        timestamp = datetime.utcnow().isoformat()
-        unique_string = f"{agent_name}:{endpoint}:{timestamp}:{uuid.uuid4()}"
+        # Generate unique identifier: 16 random bytes plus a nanosecond timestamp, hashed to 128 bits
+        seed = os.urandom(16) + time.time_ns().to_bytes(8, "little") + f"{agent_name}:{endpoint}".encode()
+        identifier = hashlib.blake2b(seed, digest_size=16).hexdigest()  # 32 hex chars
         
-        # Generate hash using SHA-256
-        hash_object = hashlib.sha256(unique_string.encode())
-        identifier = hash_object.hexdigest()[:32]  # 取前32位
-        
-        return f"did:{self.method}:local:{identifier}"
+        return self._local_prefix + identifier
     
     def validate_did(self, did: str) -> bool:
         """Validate DID format
         
         format: did:agentmessage:{network}:{identifier}
         """
-        parts = did.split(':')
-        return (
-            len(parts) == 4 and
-            parts[0] == 'did' and
-            parts[1] == self.method and
-            parts[2] in ['local', 'remote'] and
-            len(parts[3]) == 32
-        )
\ No newline at end of file
+        return self._did_re.fullmatch(did) is not None
\ No newline at end of file
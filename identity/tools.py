@@ -4,14 +4,309 @@ Provides functions for registering, recalling identity information and going onl
 """
 
 import os
+import atexit
+import asyncio
 import sqlite3
-from pathlib import Path
+import weakref
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import Optional, Dict, Any
+from message import jsonutil, pool
 from .identity_manager import IdentityManager
 from .models import AgentIdentity
-import psycopg2
-import json
-from dotenv import load_dotenv
+
+# IdentityManager and loaded identity reused across tool calls.
+# The manager is rebuilt when AGENTMESSAGE_MEMORY_PATH changes; the identity is reloaded when
+# identity.json changes on disk (mtime/size) or after save_identity().
+_IDM: Optional[IdentityManager] = None
+_IDM_KEY: Optional[str] = None
+_IDENTITY_CACHE: Optional[AgentIdentity] = None
+_IDENTITY_STAMP: Optional[tuple] = None
+
+
+def _get_manager() -> IdentityManager:
+    """Return the shared IdentityManager for the current AGENTMESSAGE_MEMORY_PATH"""
+    global _IDM, _IDM_KEY
+    key = os.environ.get('AGENTMESSAGE_MEMORY_PATH')
+    if _IDM is None or key != _IDM_KEY:
+        _IDM = IdentityManager()
+        _IDM_KEY = key
+    return _IDM
+
+
+def _invalidate_identity_cache() -> None:
+    global _IDENTITY_CACHE, _IDENTITY_STAMP
+    _IDENTITY_CACHE = None
+    _IDENTITY_STAMP = None
+
+
+def _load_cached_identity(identity_manager: IdentityManager) -> Optional[AgentIdentity]:
+    """Load the identity with a single stat, reusing the cached object while identity.json is unchanged
+
+    Returns None if identity.json is missing or cannot be loaded.
+    """
+    global _IDENTITY_CACHE, _IDENTITY_STAMP
+    try:
+        st = os.stat(identity_manager.identity_file)
+    except OSError:
+        _invalidate_identity_cache()
+        return None
+
+    stamp = (str(identity_manager.identity_file), st.st_mtime_ns, st.st_size)
+    if stamp == _IDENTITY_STAMP:
+        return _IDENTITY_CACHE
+
+    identity = identity_manager.load_identity()
+    if identity is None:
+        _invalidate_identity_cache()
+        return None
+    _IDENTITY_CACHE = identity
+    _IDENTITY_STAMP = stamp
+    return identity
+
+
+def _require_identity() -> tuple[Optional[AgentIdentity], Optional[Dict[str, Any]]]:
+    """Load the registered identity for the publish tools
+
+    Returns (identity, None) on success, or (None, error response) if AGENTMESSAGE_MEMORY_PATH is not
+    set or holds no loadable identity.
+    """
+    # Check AGENTMESSAGE_MEMORY_PATH environment variable
+    memory_path = os.environ.get('AGENTMESSAGE_MEMORY_PATH')
+    if not memory_path:
+        return None, {
+            "status": "error",
+            "message": "AGENTMESSAGE_MEMORY_PATH environment variable is not set"
+        }
+    
+    # Use IdentityManager to load identity information
+    identity_manager = _get_manager()
+    
+    identity = _load_cached_identity(identity_manager)
+    if not identity and not identity_manager.identity_file.exists():
+        return None, {
+            "status": "error",
+            "message": "Identity information in AGENTMESSAGE_MEMORY_PATH is empty, please use register_recall_id tool to register identity information first, then retry"
+        }
+    if not identity:
+        return None, {
+            "status": "error",
+            "message": "Failed to load identity information, please check if the identity file is corrupted"
+        }
+    return identity, None
+
+
+# REMOTE_DB_* settings in the order returned by _remote_db_config(), with their defaults
+_REMOTE_KEYS = {
+    'REMOTE_DB_HOST': None,
+    'REMOTE_DB_PORT': '5432',
+    'REMOTE_DB_NAME': None,
+    'REMOTE_DB_USER': None,
+    'REMOTE_DB_PASSWORD': None,
+    'REMOTE_DB_SSL_MODE': 'prefer',
+}
+
+
+@lru_cache(maxsize=1)
+def _remote_db_config() -> tuple:
+    """Load .env once and return (host, port, dbname, user, password, sslmode) for the remote database
+
+    Call _remote_db_config.cache_clear() to pick up changes to .env or the environment.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    env = os.environ
+    return tuple(env.get(key, default) for key, default in _REMOTE_KEYS.items())
+
+
+def _remote_via_pgbouncer() -> bool:
+    """Whether REMOTE_DB_HOST is a pgbouncer in transaction pooling mode (REMOTE_DB_VIA_PGBOUNCER=true)
+
+    Session-level prepared statements cannot be used there: the EXECUTE may run on another backend.
+    """
+    _remote_db_config()  # loads .env
+    return os.environ.get('REMOTE_DB_VIA_PGBOUNCER', 'false').lower() == 'true'
+
+
+_SQL_CREATE_IDENTITIES = """
+    CREATE TABLE IF NOT EXISTS identities (
+        did TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        capabilities TEXT NOT NULL DEFAULT '[]',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID
+"""
+_IDENTITY_COLUMNS = "did, name, description, capabilities, created_at, updated_at"
+# updated_at holds CURRENT_TIMESTAMP text (YYYY-MM-DD HH:MM:SS), which sorts lexicographically
+_SQL_CREATE_IDENTITIES_INDEX = "CREATE INDEX IF NOT EXISTS identities_updated_at_idx ON identities(updated_at)"
+_SQL_UPSERT_IDENTITY = """
+    INSERT OR REPLACE INTO identities 
+    (did, name, description, capabilities, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+# Like _SQL_UPSERT_IDENTITY, but leaves a row (and its updated_at) untouched when nothing changed
+_SQL_UPSERT_IDENTITY_IF_CHANGED = """
+    INSERT INTO identities (did, name, description, capabilities, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(did) DO UPDATE SET
+        name = excluded.name,
+        description = excluded.description,
+        capabilities = excluded.capabilities,
+        updated_at = excluded.updated_at
+    WHERE identities.name IS NOT excluded.name
+       OR identities.description IS NOT excluded.description
+       OR identities.capabilities IS NOT excluded.capabilities
+"""
+_SQL_SELECT_IDENTITIES = """
+    SELECT did, name, description, capabilities, created_at, updated_at
+    FROM identities
+    ORDER BY updated_at DESC
+"""
+_SQL_SELECT_IDENTITIES_LIMIT = _SQL_SELECT_IDENTITIES + "    LIMIT ?\n"
+
+# identities.db paths whose identities schema has already been created, so the idempotent DDL is
+# not re-parsed on every publish
+_SCHEMA_READY: set[str] = set()
+
+# PRAGMA user_version of identities.db once its schema and data migrations have run, so later
+# processes skip the DDL entirely
+_IDENTITIES_SCHEMA_VERSION = 1
+
+
+@contextmanager
+def _identities_conn(db_path, read_only: bool = False):
+    """Yield a pooled connection to identities.db, creating the schema once per path on write access.
+
+    Connections come from message.pool, the same process-wide pool send_message and
+    check_new_messages use for identities.db, so each file has one set of tuned, long-lived connections.
+    """
+    path = str(db_path)
+    if read_only:
+        with pool.acquire_ro(path) as conn:
+            yield conn
+        return
+    if not os.path.exists(path):
+        # New or removed database file: the schema has to be created again
+        _SCHEMA_READY.discard(path)
+    with pool.get_rw(path) as conn:
+        if path not in _SCHEMA_READY:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < _IDENTITIES_SCHEMA_VERSION:
+                conn.execute(_SQL_CREATE_IDENTITIES)
+                _migrate_without_rowid(conn)
+                conn.execute(_SQL_CREATE_IDENTITIES_INDEX)
+                # Re-encode capabilities written with spaced separators by older versions as compact JSON
+                conn.execute(
+                    "UPDATE identities SET capabilities = json(capabilities) "
+                    "WHERE json_valid(capabilities) AND capabilities <> json(capabilities)"
+                )
+                conn.execute(f"PRAGMA user_version = {_IDENTITIES_SCHEMA_VERSION}")
+                conn.commit()
+            _SCHEMA_READY.add(path)
+        yield conn
+
+
+def _migrate_without_rowid(conn: sqlite3.Connection) -> None:
+    """Rebuild an identities table created by older versions (rowid table) as WITHOUT ROWID"""
+    table_sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'identities'"
+    ).fetchone()[0]
+    if "WITHOUT ROWID" in table_sql.upper():
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("DROP TABLE IF EXISTS identities_new")
+    conn.execute(_SQL_CREATE_IDENTITIES.replace("identities", "identities_new", 1))
+    conn.execute(f"INSERT INTO identities_new ({_IDENTITY_COLUMNS}) SELECT {_IDENTITY_COLUMNS} FROM identities")
+    # Dropping the old table also drops its indexes; the caller recreates them
+    conn.execute("DROP TABLE identities")
+    conn.execute("ALTER TABLE identities_new RENAME TO identities")
+
+
+# PostgreSQL connections for discovered_globally, reused across calls.
+# The pool is rebuilt when the connection settings change; the identities DDL runs once per database.
+_PG_POOL = None
+_PG_POOL_DSN: Optional[str] = None
+# (host, port, dbname) of PostgreSQL databases whose identities table has already been created;
+# kept apart from _SCHEMA_READY and free of credentials
+_PG_SCHEMA_READY: set[tuple] = set()
+
+
+def _get_pg_pool(connection_string: str):
+    """Return the shared psycopg2 connection pool for connection_string"""
+    global _PG_POOL, _PG_POOL_DSN
+    import psycopg2.pool
+
+    if _PG_POOL is None or _PG_POOL.closed or _PG_POOL_DSN != connection_string:
+        _close_pg_pool()
+        _PG_POOL = psycopg2.pool.ThreadedConnectionPool(1, 4, connection_string)
+        _PG_POOL_DSN = connection_string
+    return _PG_POOL
+
+
+def _close_pg_pool() -> None:
+    global _PG_POOL, _PG_POOL_DSN
+    if _PG_POOL is not None and not _PG_POOL.closed:
+        _PG_POOL.closeall()
+    _PG_POOL = None
+    _PG_POOL_DSN = None
+
+
+atexit.register(_close_pg_pool)
+
+
+_PG_UPSERT_CONFLICT = """
+    ON CONFLICT (did) DO UPDATE SET
+        name = EXCLUDED.name,
+        description = EXCLUDED.description,
+        capabilities = EXCLUDED.capabilities,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Pooled PostgreSQL connections on which the publish_identity statement has been prepared
+_PG_PREPARED: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def _pg_upsert_identities(cursor, identities: list[AgentIdentity]) -> None:
+    """Upsert identities into the remote identities table in one round trip
+
+    A single identity goes through a statement prepared once per connection, so repeat publishes
+    skip parsing and planning; batches, and everything behind pgbouncer (REMOTE_DB_VIA_PGBOUNCER),
+    are sent as one plain multi-row INSERT.
+    """
+    from psycopg2.extras import Json, execute_values
+
+    rows = [
+        (identity.did, identity.name, identity.description, Json(identity.capabilities, dumps=jsonutil.dumps))
+        for identity in identities
+    ]
+    if len(rows) == 1 and not _remote_via_pgbouncer():
+        conn = cursor.connection
+        if conn not in _PG_PREPARED:
+            cursor.execute(
+                """
+                PREPARE publish_identity (text, text, text, jsonb) AS
+                INSERT INTO identities 
+                (did, name, description, capabilities, updated_at)
+                VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
+                """ + _PG_UPSERT_CONFLICT
+            )
+            _PG_PREPARED.add(conn)
+        cursor.execute("EXECUTE publish_identity (%s, %s, %s, %s)", rows[0])
+        return
+
+    execute_values(
+        cursor,
+        """
+        INSERT INTO identities 
+        (did, name, description, capabilities, updated_at)
+        VALUES %s
+        """ + _PG_UPSERT_CONFLICT,
+        rows,
+        template="(%s, %s, %s, %s, CURRENT_TIMESTAMP)",
+    )
+
 
 def register_recall_id(
     name: Optional[str] = None,
@@ -28,23 +323,17 @@ def register_recall_id(
     Returns:
         Dictionary containing identity information or prompt information
     """
-    identity_manager = IdentityManager()
+    identity_manager = _get_manager()
     
     # Check if identity information already exists
-    if identity_manager.has_identity():
+    existing_identity = _load_cached_identity(identity_manager)
+    if existing_identity:
         # If identity information already exists, return directly
-        existing_identity = identity_manager.load_identity()
-        if existing_identity:
-            return {
-                "status": "success",
-                "message": "Agent identity information already exists",
-                "identity": {
-                    "name": existing_identity.name,
-                    "description": existing_identity.description,
-                    "capabilities": existing_identity.capabilities,
-                    "did": existing_identity.did
-                }
-            }
+        return {
+            "status": "success",
+            "message": "Agent identity information already exists",
+            "identity": existing_identity.to_dict()
+        }
     
     # If no identity information exists, check parameters
     if not name or not description or not capabilities:
@@ -63,16 +352,13 @@ def register_recall_id(
         new_identity = identity_manager.create_identity(name, description, capabilities)
         
         # Save identity information
-        if identity_manager.save_identity(new_identity):
+        saved = identity_manager.save_identity(new_identity)
+        _invalidate_identity_cache()
+        if saved:
             return {
                 "status": "success",
                 "message": "Agent identity information created successfully",
-                "identity": {
-                    "name": new_identity.name,
-                    "description": new_identity.description,
-                    "capabilities": new_identity.capabilities,
-                    "did": new_identity.did
-                }
+                "identity": new_identity.to_dict()
             }
         else:
             return {
@@ -103,95 +389,84 @@ def discovered_locally() -> Dict[str, Any]:
             "status": "success" | "error",
             "message": "Agent identity information has been successfully published to the public database | Failed to publish identity information: {error message}",
             "published_identity": {
-                "did": "...",
                 "name": "...",
                 "description": "...",
-                "capabilities": [...]
+                "capabilities": [...],
+                "did": "...",
+                "created_at": "...",
+                "updated_at": "..."
             },
             "database_path": "/absolute/path/to/identities.db"
         }
     """
-    # Check AGENTMESSAGE_MEMORY_PATH environment variable
-    memory_path = os.getenv('AGENTMESSAGE_MEMORY_PATH')
-    if not memory_path:
-        return {
-            "status": "error",
-            "message": "AGENTMESSAGE_MEMORY_PATH environment variable is not set"
-        }
+    # Load identity information from AGENTMESSAGE_MEMORY_PATH
+    identity, error = _require_identity()
+    if error:
+        return error
     
-    # Use IdentityManager to load identity information
-    identity_manager = IdentityManager()
+    result = publish_identities([identity])
+    if result["status"] != "success":
+        return result
+    return {
+        "status": "success",
+        "message": "Agent identity information has been successfully published to the public database",
+        "published_identity": identity.to_dict(),
+        "database_path": result["database_path"]
+    }
+
+def publish_identities(identities: list[AgentIdentity], only_if_changed: bool = False) -> Dict[str, Any]:
+    """Publish several identities to $AGENTMESSAGE_PUBLIC_DATABLOCKS/identities.db in one transaction
     
-    if not identity_manager.has_identity():
-        return {
-            "status": "error",
-            "message": "Identity information in AGENTMESSAGE_MEMORY_PATH is empty, please use register_recall_id tool to register identity information first, then retry"
-        }
+    Args:
+        identities: AgentIdentity objects to insert or update
+        only_if_changed: Skip identities whose stored name, description and capabilities already match,
+            so their updated_at is not bumped; published_count then counts only rows written
     
-    # Load identity information
-    identity = identity_manager.load_identity()
-    if not identity:
-        return {
-            "status": "error",
-            "message": "Failed to load identity information, please check if the identity file is corrupted"
+    Returns:
+        {
+            "status": "success" | "error",
+            "message": "...",
+            "published_count": <int>,
+            "database_path": "/absolute/path/to/identities.db"
         }
-    
+    """
     try:
         # Use AGENTMESSAGE_PUBLIC_DATABLOCKS environment variable to specify public database directory
-        public_dir_env = os.getenv('AGENTMESSAGE_PUBLIC_DATABLOCKS')
+        public_dir_env = os.environ.get('AGENTMESSAGE_PUBLIC_DATABLOCKS')
         if not public_dir_env:
             return {
                 "status": "error",
                 "message": "AGENTMESSAGE_PUBLIC_DATABLOCKS environment variable is not set, please add it to the MCP configuration file and retry"
             }
-        data_dir = Path(public_dir_env)
-        if data_dir.exists() and not data_dir.is_dir():
+        # makedirs covers both the existence check and missing parents without a separate stat
+        try:
+            os.makedirs(public_dir_env, exist_ok=True)
+        except (FileExistsError, NotADirectoryError):
             return {
                 "status": "error",
-                "message": f"AGENTMESSAGE_PUBLIC_DATABLOCKS points to a non-directory path: {str(data_dir)}"
+                "message": f"AGENTMESSAGE_PUBLIC_DATABLOCKS points to a non-directory path: {public_dir_env}"
             }
-        data_dir.mkdir(parents=True, exist_ok=True)
         
         # Connect to $AGENTMESSAGE_PUBLIC_DATABLOCKS/identities.db database
-        db_path = data_dir / "identities.db"
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Create identities table (if not exists)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS identities (
-                did TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT NOT NULL,
-                capabilities TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Convert capabilities list to JSON string
-        import json
-        capabilities_json = json.dumps(identity.capabilities, ensure_ascii=False)
+        db_path = os.path.join(public_dir_env, "identities.db")
         
-        # Insert or update identity information
-        cursor.execute("""
-            INSERT OR REPLACE INTO identities 
-            (did, name, description, capabilities, updated_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """, (identity.did, identity.name, identity.description, capabilities_json))
+        # capabilities lists are stored as JSON strings
+        rows = [
+            (identity.did, identity.name, identity.description, jsonutil.dumps(identity.capabilities))
+            for identity in identities
+        ]
         
-        conn.commit()
-        conn.close()
+        # Insert or update all identities in a single transaction (identities table is created with the connection)
+        with _identities_conn(db_path) as conn:
+            before = conn.total_changes
+            conn.executemany(_SQL_UPSERT_IDENTITY_IF_CHANGED if only_if_changed else _SQL_UPSERT_IDENTITY, rows)
+            published_count = conn.total_changes - before if only_if_changed else len(rows)
+            conn.commit()
         
         return {
             "status": "success",
-            "message": "Agent identity information has been successfully published to the public database",
-            "published_identity": {
-                "did": identity.did,
-                "name": identity.name,
-                "description": identity.description,
-                "capabilities": identity.capabilities
-            },
+            "message": f"Published {published_count} identities to the public database",
+            "published_count": published_count,
             "database_path": str(db_path)
         }
         
@@ -201,6 +476,39 @@ def discovered_locally() -> Dict[str, Any]:
             "message": f"Failed to publish identity information: {str(e)}"
         }
 
+def _decode_capabilities(capabilities_text) -> list:
+    """capabilities is stored as JSON text (never NULL), needs to be deserialized into a list"""
+    try:
+        capabilities = jsonutil.loads(capabilities_text)
+        # Exact type check is enough: JSON decoding only ever produces plain lists
+        return capabilities if type(capabilities) is list else []
+    except Exception:
+        return []
+
+
+def _local_identity_row(cursor: sqlite3.Cursor, row: tuple) -> dict:
+    """Row factory building the collect_local_identities result dict directly from a _SQL_SELECT_IDENTITIES row"""
+    return {
+        "did": row[0],
+        "name": row[1],
+        "description": row[2],
+        "capabilities": _decode_capabilities(row[3]),
+        "created_at": row[4],
+        "updated_at": row[5],
+        "position": "local"
+    }
+
+
+def _read_local_identities(db_path, limit: int | None) -> list[dict]:
+    """Read identities.db rows, most recently updated first, as result dicts (blocking)"""
+    with _identities_conn(db_path, read_only=True) as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = _local_identity_row
+        if limit is not None and isinstance(limit, int) and limit > 0:
+            return cursor.execute(_SQL_SELECT_IDENTITIES_LIMIT, (limit,)).fetchall()
+        return cursor.execute(_SQL_SELECT_IDENTITIES).fetchall()
+
+
 async def collect_local_identities(limit: int | None = None) -> dict:
     """Collect identities from identities.db database
     Path:
@@ -228,57 +536,23 @@ async def collect_local_identities(limit: int | None = None) -> dict:
     }
     """
     try:
-        public_dir_env = os.getenv("AGENTMESSAGE_PUBLIC_DATABLOCKS")
+        public_dir_env = os.environ.get("AGENTMESSAGE_PUBLIC_DATABLOCKS")
         if not public_dir_env:
             return {
                 "status": "error",
                 "message": "AGENTMESSAGE_PUBLIC_DATABLOCKS environment variable is not set. Please define it in the MCP configuration file."
             }
         
-        db_path = Path(public_dir_env) / "identities.db"
-        if not db_path.exists():
+        db_path = os.path.join(public_dir_env, "identities.db")
+        if not os.path.exists(db_path):
             return {
                 "status": "error",
                 "message": "identities.db file not found",
                 "expected_path": str(db_path)
             }
         
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        sql = """
-            SELECT did, name, description, capabilities, created_at, updated_at
-            FROM identities
-            ORDER BY datetime(updated_at) DESC
-        """
-        if limit is not None and isinstance(limit, int) and limit > 0:
-            sql += " LIMIT ?"
-            cursor.execute(sql, (limit,))
-        else:
-            cursor.execute(sql)
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        identities = []
-        for did, name, description, capabilities_text, created_at, updated_at in rows:
-            # capabilities is stored as JSON text, needs to be deserialized into a list
-            try:
-                capabilities = json.loads(capabilities_text) if capabilities_text else []
-                if not isinstance(capabilities, list):
-                    capabilities = []
-            except Exception:
-                capabilities = []
-            
-            identities.append({
-                "did": did,
-                "name": name,
-                "description": description,
-                "capabilities": capabilities,
-                "created_at": created_at,
-                "updated_at": updated_at,
-                "position": "local"
-            })
+        # Query and decode off the event loop
+        identities = await asyncio.to_thread(_read_local_identities, db_path, limit)
         
         return {
             "status": "success",
@@ -314,50 +588,28 @@ def discovered_globally() -> Dict[str, Any]:
             "status": "success" | "error",
             "message": "Agent identity information has been successfully published to the remote database | Failed to publish identity information: {error message}",
             "published_identity": {
-                "did": "...",
                 "name": "...",
                 "description": "...",
-                "capabilities": [...]
+                "capabilities": [...],
+                "did": "...",
+                "created_at": "...",
+                "updated_at": "..."
             },
             "remote_database": "host:port/database"
         }
     """
-    # Load environment variables from .env file
-    load_dotenv()
-    
-    # Check AGENTMESSAGE_MEMORY_PATH environment variable
-    memory_path = os.getenv('AGENTMESSAGE_MEMORY_PATH')
-    if not memory_path:
-        return {
-            "status": "error",
-            "message": "AGENTMESSAGE_MEMORY_PATH environment variable is not set"
-        }
-    
-    # Use IdentityManager to load identity information
-    identity_manager = IdentityManager()
-    
-    if not identity_manager.has_identity():
-        return {
-            "status": "error",
-            "message": "Identity information in AGENTMESSAGE_MEMORY_PATH is empty, please use register_recall_id tool to register identity information first, then retry"
-        }
-    
-    # Load identity information
-    identity = identity_manager.load_identity()
-    if not identity:
-        return {
-            "status": "error",
-            "message": "Failed to load identity information, please check if the identity file is corrupted"
-        }
+    # Imported here so the local-only tools do not pay for psycopg2 at startup
+    import psycopg2
+
+    # Load environment variables from .env file (parsed once per process)
+    db_host, db_port, db_name, db_user, db_password, db_ssl_mode = _remote_db_config()
     
-    # Get remote database configuration from environment variables
-    db_host = os.getenv('REMOTE_DB_HOST')
-    db_port = os.getenv('REMOTE_DB_PORT', '5432')
-    db_name = os.getenv('REMOTE_DB_NAME')
-    db_user = os.getenv('REMOTE_DB_USER')
-    db_password = os.getenv('REMOTE_DB_PASSWORD')
-    db_ssl_mode = os.getenv('REMOTE_DB_SSL_MODE', 'prefer')
+    # Load identity information from AGENTMESSAGE_MEMORY_PATH
+    identity, error = _require_identity()
+    if error:
+        return error
     
+    # Check remote database configuration
     if not all([db_host, db_name, db_user, db_password]):
         return {
             "status": "error",
@@ -365,66 +617,58 @@ def discovered_globally() -> Dict[str, Any]:
         }
     
     try:
-        # Connect to remote PostgreSQL database
+        # Borrow a connection from the shared pool (opened on first use)
         connection_string = f"host={db_host} port={db_port} dbname={db_name} user={db_user} password={db_password} sslmode={db_ssl_mode}"
-        conn = psycopg2.connect(connection_string)
-        cursor = conn.cursor()
-        
-        # Create identities table (if not exists)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS identities (
-                did TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT NOT NULL,
-                capabilities JSONB NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Convert capabilities list to JSON
-        capabilities_json = json.dumps(identity.capabilities, ensure_ascii=False)
-        
-        # Insert or update identity information
-        cursor.execute("""
-            INSERT INTO identities 
-            (did, name, description, capabilities, updated_at)
-            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
-            ON CONFLICT (did) DO UPDATE SET
-                name = EXCLUDED.name,
-                description = EXCLUDED.description,
-                capabilities = EXCLUDED.capabilities,
-                updated_at = CURRENT_TIMESTAMP
-        """, (identity.did, identity.name, identity.description, capabilities_json))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        schema_key = (db_host, db_port, db_name)
+        pg_pool = _get_pg_pool(connection_string)
+        conn = pg_pool.getconn()
+        failed = False
+        try:
+            with conn.cursor() as cursor:
+                # Create identities table (if not exists); only needed once per database
+                if schema_key not in _PG_SCHEMA_READY:
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS identities (
+                            did TEXT PRIMARY KEY,
+                            name TEXT NOT NULL,
+                            description TEXT NOT NULL,
+                            capabilities JSONB NOT NULL,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
+                
+                # Insert or update identity information
+                _pg_upsert_identities(cursor, [identity])
+            
+            conn.commit()
+            _PG_SCHEMA_READY.add(schema_key)
+        except BaseException:
+            failed = True
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            # Connections that saw a failure are discarded (their session state, including the
+            # prepared publish statement, is unknown); the pool opens a fresh one next time
+            pg_pool.putconn(conn, close=failed or bool(conn.closed))
         
         return {
             "status": "success",
             "message": "Agent identity information has been successfully published to the remote database",
-            "published_identity": {
-                "did": identity.did,
-                "name": identity.name,
-                "description": identity.description,
-                "capabilities": identity.capabilities
-            },
+            "published_identity": identity.to_dict(),
             "remote_database": f"{db_host}:{db_port}/{db_name}"
         }
         
-    except psycopg2.Error as e:
-        return {
-            "status": "error",
-            "message": f"Failed to connect to remote database: {str(e)}"
-        }
-    except Exception as e:
-        return {
-            "status": "error",
-            "message": f"Failed to publish identity information to remote database: {str(e)}"
-        }
     except Exception as e:
+        if isinstance(e, psycopg2.Error):
+            message = f"Failed to connect to remote database: {str(e)}"
+        else:
+            message = f"Failed to publish identity information to remote database: {str(e)}"
         return {
             "status": "error",
-            "message": f"Collect identities failed: {str(e)}"
+            "message": message
         }
\ No newline at end of file
@@ -1,20 +1,22 @@
 """AgentMessage MCP server entry point"""
 
 from fastmcp import FastMCP
-from identity.tools import register_recall_id as _register_recall_id, discovered_locally as _discovered_locally, discovered_globally as _discovered_globally, collect_local_identities as _collect_local_identities
+from identity.tools import register_recall_id as _register_recall_id, discovered_locally as _discovered_locally, discovered_globally as _discovered_globally, collect_local_identities as _collect_local_identities, publish_identities
 from dotenv import load_dotenv
 import sqlite3
 import json
 import os
 from pathlib import Path
 from message.db import init_message_history_db, get_message_db_path
-import hashlib
 import re
 from datetime import datetime, timezone, timedelta
 from identity.identity_manager import IdentityManager
+from identity.models import AgentIdentity
 import asyncio
 import time
 from identity.did_generator import DIDGenerator
+import argparse
+import socket
 import subprocess
 import sys
 import threading
@@ -348,39 +350,26 @@ def check_or_create_host() -> dict | None:
 
         # Add HOST information to identities.db database
         try:
-            db_path = public_path / "identities.db"
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Create identities table (if not exists)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS identities (
-                    did TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    description TEXT NOT NULL,
-                    capabilities TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            # HOST capabilities is an empty array; the identities schema is created by publish_identities.
+            # An unchanged HOST row is left alone so restarts do not rewrite it.
+            result = publish_identities([
+                AgentIdentity(
+                    name=host_data['name'],
+                    description=host_data['description'],
+                    capabilities=[],
+                    did=host_data['did'],
                 )
-            """)
-            
-            # HOST capabilities is an empty array
-            capabilities_json = json.dumps([], ensure_ascii=False)
-            
-            # Insert or update HOST identity information
-            cursor.execute("""
-                INSERT OR REPLACE INTO identities 
-                (did, name, description, capabilities, updated_at)
-                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (host_data['did'], host_data['name'], host_data['description'], capabilities_json))
-            
-            conn.commit()
-            conn.close()
+            ], only_if_changed=True)
+            if result["status"] != "success":
+                raise RuntimeError(result["message"])
+            db_path = result["database_path"]
             
             if is_new_host:
                 print(f"  Added HOST information to database: {db_path}")
-            else:
+            elif result["published_count"]:
                 print(f"  Updated HOST information to database: {db_path}")
+            else:
+                print(f"  HOST information in database is up to date: {db_path}")
                 
         except Exception as e:
             print(f"Warning: Failed to add HOST information to identities.db: {e}")
@@ -393,55 +382,78 @@ def check_or_create_host() -> dict | None:
         return None
 
 # New: launch visualization tools at startup
-def _launch_visual_tools():
+# Warnings from these helpers go to stderr: they run after server.run() has taken over stdout for
+# the MCP stdio transport, where any other text would corrupt the JSON-RPC stream
+def _spawn_visual_tool(script: Path) -> bool:
+    """Start one visualization server script as a detached child process; False if the script is missing"""
+    if not script.exists():
+        print(f"Warning: Failed to find {script}", file=sys.stderr)
+        return False
+    subprocess.Popen(
+        [sys.executable, str(script)],
+        cwd=str(script.parent),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    return True
+
+
+def _wait_for_port(port: int, timeout: float = 30.0) -> bool:
+    """Probe 127.0.0.1:port every 100ms until it accepts connections; False if timeout elapses first"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            probe.settimeout(0.1)
+            if probe.connect_ex(("127.0.0.1", port)) == 0:
+                return True
+        time.sleep(0.1)
+    return False
+
+
+def _start_visual_tool(script: Path, port: int) -> None:
+    """Spawn a visualization server and open its page in the browser once the server is listening"""
     try:
-        base_dir = Path(__file__).parent / "database_visualization"
-        start_visualizer = base_dir / "start_visualizer.py"
-        start_message = base_dir / "start_message_interface.py"
+        if not _spawn_visual_tool(script):
+            return
+        if not _wait_for_port(port):
+            print(f"Warning: {script.name} is not accepting connections on port {port} yet", file=sys.stderr)
+        webbrowser.open(f"http://localhost:{port}")
+    except Exception as e:
+        print(f"Warning: Failed to launch visualization tool: {e}", file=sys.stderr)
 
-        if start_visualizer.exists():
-            subprocess.Popen(
-                [sys.executable, str(start_visualizer)],
-                cwd=str(base_dir),
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-        else:
-            print(f"Warning: Failed to find {start_visualizer}")
 
-        if start_message.exists():
-            subprocess.Popen(
-                [sys.executable, str(start_message)],
-                cwd=str(base_dir),
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-        else:
-            print(f"Warning: Failed to find {start_message}")
+def _launch_visual_tools():
+    """Start the visualization servers and open their pages without delaying MCP server startup.
 
-        # Open browser tabs shortly after spawning servers
-        def _open_tabs():
-            try:
-                time.sleep(10)
-                webbrowser.open("http://localhost:5001")
-                webbrowser.open("http://localhost:5002")
-            except Exception as e:
-                print(e)
-                pass
+    Each tool is spawned and probed from its own daemon thread, so main() goes straight on to
+    server.run(), each tab opens as soon as its server accepts connections, and a probe that is
+    still waiting never holds up interpreter shutdown.
+    """
+    try:
+        base_dir = Path(__file__).parent / "database_visualization"
+        tools = ((base_dir / "start_visualizer.py", 5001), (base_dir / "start_message_interface.py", 5002))
 
-        t = threading.Thread(target=_open_tabs, daemon=True)
-        t.start()
+        for script, port in tools:
+            threading.Thread(target=_start_visual_tool, args=(script, port), daemon=True).start()
 
     except Exception as e:
-        print(f"Warning: Failed to launch visualization tools: {e}")
+        print(f"Warning: Failed to launch visualization tools: {e}", file=sys.stderr)
 
 def main():
-    """Main function - uvx entry point"""
+    """Main function - uvx entry point
+
+    Pass --no-ui to skip starting the web UIs (e.g. for headless deployments).
+    """
+    parser = argparse.ArgumentParser(prog="agentmessage", add_help=False)
+    parser.add_argument("--no-ui", action="store_true")
+    args, _ = parser.parse_known_args()
+
     # Check or create HOST information before startup
     check_or_create_host()
 
     # New: auto-start UI tools in background and open browser
-    _launch_visual_tools()
+    if not args.no_ui:
+        _launch_visual_tools()
 
     server = AgentMessageMCPServer()
     server.run()
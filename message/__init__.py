@@ -1,9 +1,12 @@
 """Message module (Step 2.1: database initialization)"""
 
-from .db import init_message_history_db, get_message_db_path, get_data_dir
+from .db import init_message_history_db, get_message_db_path, get_data_dir, connect_db, close_db, bulk_import
 
 __all__ = [
     "init_message_history_db",
     "get_message_db_path",
     "get_data_dir",
+    "connect_db",
+    "close_db",
+    "bulk_import",
 ]
\ No newline at end of file
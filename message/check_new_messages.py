@@ -1,15 +1,279 @@
 import os
-import re
-import json
+import sys
 import time
 import asyncio
-import hashlib
+import heapq
 import sqlite3
+import threading
+from operator import itemgetter
 from pathlib import Path
 
-from message.db import init_message_history_db
+from message.db import init_message_history_db, mark_read
+from message import jsonutil, pool
 from identity.identity_manager import IdentityManager
 
+# SQL is kept at module scope so every poll reuses the same compiled statements from the pooled
+# connections' statement cache instead of re-parsing them.
+# The group holding the reader's most recent unread message; ties go to the smallest group_id
+# (answered from the unread partial index on message_recipients alone)
+_SQL_LATEST_UNREAD_GROUP = """
+    SELECT group_id
+    FROM message_recipients
+    WHERE did = ? AND read = 0
+    ORDER BY timestamp_ms DESC, group_id ASC
+    LIMIT 1
+"""
+# Unread/read split of one group for a reader; params (reader DID, group_id[, limit]). Unread comes from
+# the reader's message_recipients flags; every other message in the group (including the reader's own)
+# counts as read. Both are range scans on (group_id, timestamp_ms, ...), so a poll reads O(unread + limit) rows.
+# The "[JSON]" aliases make the pooled connections decode the JSON columns while fetching (None when
+# empty or malformed).
+_SQL_GROUP_UNREAD = """
+    SELECT m.message_id, m.timestamp, m.sender_did,
+           m.receiver_dids AS "receiver_dids [JSON]",
+           m.message_data AS "message_data [JSON]",
+           m.mention_dids AS "mention_dids [JSON]"
+    FROM message_recipients r
+    JOIN message_history m ON m.message_id = r.message_id
+    WHERE r.did = ?1 AND r.read = 0 AND r.group_id = ?2
+    ORDER BY r.timestamp_ms ASC
+"""
+_SQL_GROUP_READ_TAIL = """
+    SELECT m.message_id, m.timestamp, m.sender_did,
+           m.receiver_dids AS "receiver_dids [JSON]",
+           m.message_data AS "message_data [JSON]",
+           m.mention_dids AS "mention_dids [JSON]"
+    FROM message_history m
+    WHERE m.group_id = ?2 AND NOT EXISTS (
+        SELECT 1 FROM message_recipients r WHERE r.message_id = m.message_id AND r.did = ?1 AND r.read = 0
+    )
+    ORDER BY m.timestamp_ms DESC
+    LIMIT ?3
+"""
+
+# Writes from other processes send no in-process notification. Between full polls the database and
+# WAL files are stat'ed at this interval (seconds), and any change triggers an early poll.
+_CHANGE_CHECK_INTERVAL = 0.5
+
+
+def _db_signature(db_path: Path) -> tuple:
+    """(mtime_ns, size) of the database file and its WAL; changes whenever any process commits"""
+    signature = []
+    for path in (db_path, db_path.with_name(db_path.name + "-wal")):
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+# DID -> name lookup; the DIDs are bound as one JSON array, so a single fixed statement serves any
+# number of DIDs (no per-size placeholder lists, no bound-variable limit)
+_SQL_NAMES = "SELECT did, name FROM identities WHERE did IN (SELECT value FROM json_each(?))"
+
+
+def _lookup_names(conn: sqlite3.Connection, dids) -> dict[str, str]:
+    """Map DIDs to identity names with one _SQL_NAMES query"""
+    return {
+        did: name
+        for did, name in conn.execute(_SQL_NAMES, (jsonutil.dumps(list(dids)),))
+        if isinstance(name, str) and name
+    }
+
+
+# Names change rarely, so DID -> name results (including "no name") are reused across polls for
+# _NAME_TTL seconds. Keyed by (identities.db path, DID); values are (name or None, expiry).
+# A path's entries are also dropped as soon as identities.db (or its WAL) changes on disk, so
+# renames show up on the next poll; the TTL only backs up coarse file timestamps.
+_NAME_TTL = 60.0
+_NAME_CACHE_MAX = 4096  # expired entries are pruned once the cache grows past this
+_NAME_CACHE: dict[tuple[str, str], tuple[str | None, float]] = {}
+_NAME_CACHE_SIGNATURES: dict[str, tuple] = {}
+# Polls run _names_for in worker threads; guards both dicts (the identities query runs outside it)
+_NAME_CACHE_LOCK = threading.Lock()
+
+
+def _names_for(id_db_path: Path, dids) -> dict[str, str]:
+    """Map DIDs to names, querying identities.db only for DIDs missing from or expired in the cache"""
+    key_path = str(id_db_path)
+    signature = _db_signature(id_db_path)
+    now = time.monotonic()
+    did_to_name: dict[str, str] = {}
+    missing = []
+    with _NAME_CACHE_LOCK:
+        if _NAME_CACHE_SIGNATURES.get(key_path) != signature:
+            for key in [k for k in _NAME_CACHE if k[0] == key_path]:
+                del _NAME_CACHE[key]
+            _NAME_CACHE_SIGNATURES[key_path] = signature
+        for did in dids:
+            name, expiry = _NAME_CACHE.get((key_path, did), (None, 0.0))
+            if expiry < now:
+                missing.append(did)
+            elif name is not None:
+                did_to_name[did] = name
+    if missing:
+        with pool.acquire_ro(id_db_path) as id_conn:
+            found = _lookup_names(id_conn, missing)
+        expiry = now + _NAME_TTL
+        with _NAME_CACHE_LOCK:
+            if len(_NAME_CACHE) > _NAME_CACHE_MAX:
+                for key in [k for k, (_, exp) in _NAME_CACHE.items() if exp < now]:
+                    del _NAME_CACHE[key]
+            for did in missing:
+                _NAME_CACHE[(key_path, did)] = (found.get(did), expiry)
+        did_to_name.update(found)
+    return did_to_name
+
+
+def _intern(value):
+    """sys.intern for strings; other values (from malformed JSON) are returned unchanged"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def _poll_inbox(db_path: Path, id_db_path: Path | None, my_did: str, limit: int) -> dict | None:
+    """Scan for the latest group with messages unread by my_did and mark them read (blocking).
+
+    Returns the success payload, or None when there is nothing new. id_db_path is the identities.db
+    used for DID -> name conversion (None when unknown).
+    Runs in a worker thread so the poll loop never blocks the event loop on SQLite. The scans run on a
+    pooled read-only connection; the process-wide writer is only taken to mark the returned messages read.
+    """
+    with pool.acquire_ro(db_path) as conn:
+        cursor = conn.cursor()
+
+        # Only the group with the latest unread message is returned (and marked read), so find it
+        # directly; other groups keep their unread messages for later polls
+        cursor.execute(_SQL_LATEST_UNREAD_GROUP, (my_did,))
+        latest = cursor.fetchone()
+
+        groups = []
+        # (group_id, new_count, messages, messages_to_mark_read, member_dids, mention_dids_in_group)
+        latest_group_info = None
+
+        # identities.db for DID->name conversion; it may only appear after polling started
+        has_id_db = bool(id_db_path and id_db_path.exists())
+
+        if latest is not None:
+            gid = latest[0]
+            # Return "all unread + last limit read": unread messages in ascending order, plus the
+            # latest `limit` read ones (negative limit -> all read messages, 0 -> none)
+            cursor.execute(_SQL_GROUP_UNREAD, (my_did, gid))
+            rows = [(row, True) for row in cursor.fetchall()]   # True -> is_new
+            if limit != 0:
+                cursor.execute(_SQL_GROUP_READ_TAIL, (my_did, gid, limit))
+                rows += [(row, False) for row in reversed(cursor.fetchall())]
+
+            # Separate unread/read, collect DID sets
+            unread_items = []  # [(mid, ts, sender, receivers, msg_data, mentions, is_new)]
+            read_items = []    # [(mid, ts, sender, receivers, msg_data, mentions, is_new)]
+            member_dids: set[str] = set()   # senders and receivers, reported as the group members
+            mention_dids_in_group: set[str] = set()
+            messages_to_mark_read = []
+            new_count = 0
+
+            for (mid, ts, sender, receivers, msg_data, mentions), is_new in rows:
+                if receivers is None:
+                    receivers = []
+                if msg_data is None:
+                    msg_data = {}
+                if mentions is None:
+                    mentions = []
+
+                # The same few DIDs recur in every row: intern them so set/dict lookups below (and the name
+                # cache keys) compare by identity instead of character by character
+                sender = sys.intern(sender)
+                receivers = [_intern(d) for d in receivers]
+                mentions = [_intern(d) for d in mentions]
+
+                if sender:
+                    member_dids.add(sender)
+                member_dids.update(receivers)
+                mention_dids_in_group.update(mentions)
+
+                if is_new:
+                    new_count += 1
+                    messages_to_mark_read.append(mid)
+                    unread_items.append((mid, ts, sender, receivers, msg_data, mentions, True))
+                else:
+                    read_items.append((mid, ts, sender, receivers, msg_data, mentions, False))
+
+            # Combine returned set: all unread + selected read, by time ascending. Both lists already come
+            # out of SQL in ascending order, so merge them instead of re-sorting (ties keep unread first)
+            selected_msgs = list(heapq.merge(unread_items, read_items, key=itemgetter(1)))
+
+            # Select DID -> name mappings (batch query based on DIDs in returned messages)
+            did_to_name = {}
+            dids_in_group = member_dids | mention_dids_in_group
+            if has_id_db and dids_in_group:
+                try:
+                    did_to_name = _names_for(id_db_path, dids_in_group)
+                except Exception:
+                    did_to_name = {}
+
+            # Construct returned messages
+            messages = []
+            for (mid, ts, sender, receivers, msg_data, mentions, is_new) in selected_msgs:
+                sender_name = did_to_name.get(sender, sender)
+                receiver_names = [did_to_name.get(d, d) for d in receivers]
+                mention_names = [did_to_name.get(d, d) for d in mentions]
+
+                messages.append({
+                    "message_id": mid,
+                    "timestamp": ts,
+                    "sender_did": sender,
+                    "sender_name": sender_name,
+                    "receiver_dids": receivers,
+                    "receiver_names": receiver_names,
+                    "message_data": msg_data,
+                    "mention_dids": mentions,
+                    "mention_names": mention_names,
+                    "is_new": is_new
+                })
+
+            if new_count > 0:
+                latest_group_info = (gid, new_count, messages, messages_to_mark_read,
+                                     member_dids, mention_dids_in_group)
+
+        # If there are new messages, only process the group with the latest timestamp
+        if latest_group_info is not None:
+            gid, new_count, messages, messages_to_mark_read, member_dids, mention_dids_in_group = latest_group_info
+
+            # Mark only the latest group's unread messages as read, in a single transaction
+            with pool.get_rw(db_path) as rw_conn:
+                if not rw_conn.in_transaction:
+                    rw_conn.execute("BEGIN IMMEDIATE")
+                mark_read(rw_conn, messages_to_mark_read, my_did)
+                rw_conn.commit()
+
+            # Return only the latest group
+            groups = [{
+                "group_id": gid,
+                "new_count": new_count,
+                "messages": messages
+            }]
+
+            # Group member DIDs (collected while building the messages), excluding the local receiver
+            group_member_dids = sorted(member_dids)
+            group_member_dids_other_than_receiver = [did for did in group_member_dids if did != my_did]
+
+            prompt_msg = ""
+            if my_did in mention_dids_in_group:
+                prompt_msg = f"You have {new_count} new messages in the latest group. The group members include {group_member_dids}, Please use send_message to reply to {group_member_dids_other_than_receiver}. Note you are mentioned in the messages."
+            else:
+                prompt_msg = f"You have {new_count} new messages in the latest group. The group members include {group_member_dids}, Please use send_message to reply to {group_member_dids_other_than_receiver}."
+            return {
+                "status": "success",
+                "message": "There are new messages. Please use send_message to reply.",
+                "groups": groups,
+                "database_path": str(db_path),
+                "prompt": prompt_msg
+            }
+
+        conn.commit()
+    return None
+
+
 async def _check_new_messages(
         poll_interval: int = 5,
         timeout: int | None = None,
@@ -99,226 +363,51 @@ async def _check_new_messages(
 
         # New: Poll when no new messages, until timeout or new messages
         start_time = time.time()
-        while True:
-            # Initialize/ locate message database (using $AGENTMESSAGE_PUBLIC_DATABLOCKS)
+        # Woken early by in-process sends to this DID, or when the database files change (other processes)
+        inbox_event = pool.subscribe(my_did)
+        try:
+            # Locate (and initialize) the databases once; the loop re-initializes only if the message
+            # database file disappears
             db_path = init_message_history_db()
-            conn = sqlite3.connect(db_path)
-            try:
-                cursor = conn.cursor()
-
-                # Find groups with messages containing local DID as receiver
-                cursor.execute(
-                    """
-                    SELECT DISTINCT group_id
-                    FROM message_history
-                    WHERE receiver_dids LIKE ?
-                    """,
-                    (f'%"{my_did}"%',),
-                )
-                groups_with_messages = [row[0] for row in cursor.fetchall()]
-
-                groups = []
-                total_new = 0
-                latest_group_info = None  # (group_id, latest_timestamp, new_count, messages, messages_to_mark_read)
-
-                # Prepare identities.db path for DID->name conversion
-                did_to_name_cache: dict[str, str] = {}
-                public_dir_env = os.getenv("AGENTMESSAGE_PUBLIC_DATABLOCKS")
-                id_db_path = Path(public_dir_env) / "identities.db" if public_dir_env else None
-                id_conn = None
-                if id_db_path and id_db_path.exists():
-                    try:
-                        id_conn = sqlite3.connect(id_db_path)
-                    except Exception:
-                        id_conn = None
-
-                for gid in sorted(groups_with_messages):
-                    # Collect all messages in the group (ascending order), filter unread and read, return "all unread + last limit read"
-                    cursor.execute(
-                        """
-                        SELECT message_id, timestamp, sender_did, receiver_dids, message_data, mention_dids, read_status
-                        FROM message_history
-                        WHERE group_id = ?
-                        ORDER BY timestamp ASC
-                        """,
-                        (gid,),
-                    )
-                    rows = cursor.fetchall()
-
-                    # First pass: Parse JSON, separate unread/read, collect DID sets
-                    unread_items = []  # [(mid, ts, sender, receivers, msg_data, mentions, existing_rs)]
-                    read_items = []    # [(mid, ts, sender, receivers, msg_data, mentions, existing_rs)]
-                    dids_in_group: set[str] = set()
-                    messages_to_mark_read = []
-                    new_count = 0
-
-                    for (mid, ts, sender, recv_json, data_json, mention_json, read_status_json) in rows:
-                        try:
-                            receivers = json.loads(recv_json) if recv_json else []
-                        except Exception:
-                            receivers = []
-                        try:
-                            msg_data = json.loads(data_json) if data_json else {}
-                        except Exception:
-                            msg_data = {}
-                        try:
-                            mentions = json.loads(mention_json) if mention_json else []
-                        except Exception:
-                            mentions = []
-                        try:
-                            read_status = json.loads(read_status_json) if read_status_json else {}
-                        except Exception:
-                            read_status = {}
-
-                        dids_in_group.add(sender)
-                        for r in receivers:
-                            dids_in_group.add(r)
-                        for m in mentions:
-                            dids_in_group.add(m)
-
-                        is_read = bool(read_status.get(my_did, True))
-                        if not is_read:
-                            new_count += 1
-                            messages_to_mark_read.append((mid, read_status))
-                            unread_items.append((mid, ts, sender, receivers, msg_data, mentions, True))   # True -> is_new
-                        else:
-                            read_items.append((mid, ts, sender, receivers, msg_data, mentions, False))  # False -> is_new
-
-                    # Select last limit read messages
-                    if isinstance(limit, int) and limit > 0:
-                        selected_read = read_items[-limit:]
-                    elif isinstance(limit, int) and limit == 0:
-                        selected_read = []
-                    else:
-                        selected_read = read_items
-
-                    # Combine returned set: all unread + selected read, then sort by time ascending
-                    selected_msgs = unread_items + selected_read
-                    selected_msgs.sort(key=lambda x: x[1])  # Sort by timestamp ascending
-
-                    # Select DID -> name mappings (batch query based on DIDs in returned messages)
-                    did_to_name = {}
-                    if id_conn and dids_in_group:
-                        try:
-                            placeholders = ",".join("?" for _ in dids_in_group)
-                            id_cur = id_conn.cursor()
-                            id_cur.execute(
-                                f"SELECT did, name FROM identities WHERE did IN ({placeholders})",
-                                tuple(dids_in_group),
-                            )
-                            for did, name in id_cur.fetchall():
-                                if isinstance(name, str) and name:
-                                    did_to_name[did] = name
-                        except Exception:
-                            did_to_name = {}
-
-                    # Construct returned messages
-                    messages = []
-                    for (mid, ts, sender, receivers, msg_data, mentions, is_new) in selected_msgs:
-                        sender_name = did_to_name.get(sender, sender)
-                        receiver_names = [did_to_name.get(d, d) for d in receivers]
-                        mention_names = [did_to_name.get(d, d) for d in mentions]
-
-                        messages.append({
-                            "message_id": mid,
-                            "timestamp": ts,
-                            "sender_did": sender,
-                            "sender_name": sender_name,
-                            "receiver_dids": receivers,
-                            "receiver_names": receiver_names,
-                            "message_data": msg_data,
-                            "mention_dids": mentions,
-                            "mention_names": mention_names,
-                            "is_new": is_new
-                        })
-
-                    # Track the group with latest timestamp if it has new messages
-                    if new_count > 0:
-                        # Find the latest timestamp among unread messages in this group
-                        latest_timestamp = max(ts for (mid, ts, sender, receivers, msg_data, mentions, is_new) in unread_items)
-                        
-                        # Update latest_group_info if this group has a later timestamp
-                        if latest_group_info is None or latest_timestamp > latest_group_info[1]:
-                            latest_group_info = (gid, latest_timestamp, new_count, messages, messages_to_mark_read)
-                    
-                    total_new += new_count
-
-                if id_conn:
-                    id_conn.close()
-
-                # If there are new messages, only process the group with the latest timestamp
-                if total_new > 0 and latest_group_info is not None:
-                    gid, latest_timestamp, new_count, messages, messages_to_mark_read = latest_group_info
-                    
-                    # Mark only the latest group's unread messages as read
-                    for mid, existing_rs in messages_to_mark_read:
-                        try:
-                            existing_rs = existing_rs if isinstance(existing_rs, dict) else {}
-                            existing_rs[my_did] = True
-                            cursor.execute(
-                                "UPDATE message_history SET read_status = ? WHERE message_id = ?",
-                                (json.dumps(existing_rs, ensure_ascii=False), mid),
-                            )
-                        except Exception:
-                            # Single update failure does not affect overall
-                            pass
-                    
-                    conn.commit()
-                    
-                    # Return only the latest group
-                    groups = [{
-                        "group_id": gid,
-                        "new_count": new_count,
-                        "messages": messages
-                    }]
-                    
-                    # Compute group member DIDs and exclude the local receiver
-                    dids_in_group: set[str] = set()
-                    mention_dids_in_group: set[str] = set()
-                    for _msg in messages:
-                        try:
-                            if isinstance(_msg, dict):
-                                s = _msg.get("sender_did")
-                                if s:
-                                    dids_in_group.add(s)
-                                for r in (_msg.get("receiver_dids") or []):
-                                    dids_in_group.add(r)
-                                for m in (_msg.get("mention_dids") or []):
-                                    mention_dids_in_group.add(m)
-                        except Exception:
-                            # Skip malformed message dicts without breaking the flow
-                            pass
-                    group_member_dids = sorted(dids_in_group)
-                    group_member_dids_other_than_receiver = [did for did in group_member_dids if did != my_did]
-
-                    prompt_msg = ""
-                    if my_did in mention_dids_in_group:
-                        prompt_msg = f"You have {new_count} new messages in the latest group. The group members include {group_member_dids}, Please use send_message to reply to {group_member_dids_other_than_receiver}. Note you are mentioned in the messages."
-                    else:
-                        prompt_msg = f"You have {new_count} new messages in the latest group. The group members include {group_member_dids}, Please use send_message to reply to {group_member_dids_other_than_receiver}."
+            id_db_path = db_path.with_name("identities.db")
+            while True:
+                inbox_event.clear()
+                # Taken before the poll so a commit racing with it still shows up as a change afterwards
+                signature = _db_signature(db_path)
+                if signature[0] is None:
+                    db_path = init_message_history_db()
+                    signature = _db_signature(db_path)
+                result = await asyncio.to_thread(_poll_inbox, db_path, id_db_path, my_did, limit)
+                if result is not None:
+                    return result
+
+                # There are no new messages -> check timeout or continue polling
+                if timeout is not None and timeout > 0 and time.time() - start_time >= timeout:
                     return {
-                        "status": "success",
-                        "message": "There are new messages. Please use send_message to reply.",
-                        "groups": groups,
+                        "status": "timeout",
+                        "message": "Timeout waiting for new messages.",
+                        "groups": [],
                         "database_path": str(db_path),
-                        "prompt": prompt_msg
+                        "prompt": "There are no new messages."
                     }
-                
-                conn.commit()
-            finally:
-                conn.close()
-
-            # There are no new messages -> check timeout or continue polling
-            if timeout is not None and timeout > 0 and time.time() - start_time >= timeout:
-                return {
-                    "status": "timeout",
-                    "message": "Timeout waiting for new messages.",
-                    "groups": [],
-                    "database_path": str(db_path),
-                    "prompt": "There are no new messages."
-                }
-
-            await asyncio.sleep(poll_interval)
+
+                # Wait until a message addressed to this DID is written in-process, another process commits to
+                # the database, or the polling interval elapses
+                deadline = time.time() + poll_interval
+                if timeout is not None and timeout > 0:
+                    deadline = min(deadline, start_time + timeout)
+                while True:
+                    wait = deadline - time.time()
+                    if wait <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(inbox_event.wait(), timeout=min(wait, _CHANGE_CHECK_INTERVAL))
+                        break
+                    except asyncio.TimeoutError:
+                        if _db_signature(db_path) != signature:
+                            break
+        finally:
+            pool.unsubscribe(my_did, inbox_event)
 
     except EnvironmentError as e:
         return {
@@ -10,26 +10,103 @@
   - message_data: message payload (JSON object string: text, code, images, audio, video, file info, etc.)
   - mention_dids: list of mentioned receiver DIDs (JSON array string)
   - read_status: read status per receiver (JSON object string; key=DID, value=boolean)
+- Table: message_recipients (one row per message and receiver DID)
+  - message_id, did: the message and one of its receivers
+  - read: 0/1 copy of that receiver's read_status entry, kept in sync by mark_read()
+  - group_id, timestamp_ms: copies of the message's columns, so per-DID group lookups stay in this table
+  - the partial index message_recipients_unread_ts_idx (did, timestamp_ms, group_id) WHERE read = 0 is
+    the per-DID unread set: rows are added by the insert trigger and leave it when marked read, so the
+    inbox poll's cost follows the number of unread messages rather than the size of the history
 
 Notes:
-- This file only initializes the database and table schema; it does not implement message writing logic.
+- This file initializes the database and table schema; per-message writes live in send_message.py.
+  bulk_import() is the only writer here, for loading many rows at once (migrations, transcript replay).
 - If AGENTMESSAGE_PUBLIC_DATABLOCKS is not set, an exception is raised. Please define this environment variable in the MCP configuration file.
 """
 
 import os
 import sqlite3
+import threading
+from functools import lru_cache
 from pathlib import Path
 
+from message import jsonutil
+
+# Per-connection tuning applied to every connection on the message database.
+_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA cache_size=-65536;
+"""
+
+# journal_mode=WAL is persisted in the database file, so it only needs setting once per path per process
+_WAL_PATHS: set[str] = set()
+
+# Seconds a connection waits on another connection's write lock before raising "database is locked"
+# (sqlite3's default is 5). Several agent processes share one file, and bulk_import() holds the write
+# lock for a whole load, so pooled connections that live for the process get more slack.
+_BUSY_TIMEOUT = 15.0
+
+
+def _convert_json(value: bytes):
+    """sqlite3 converter for columns selected as "name [JSON]"; empty or malformed JSON becomes None"""
+    if not value:
+        return None
+    try:
+        return jsonutil.loads(value)
+    except ValueError:
+        return None
+
+
+# Connections opened with detect_types=sqlite3.PARSE_COLNAMES decode JSON columns aliased with a
+# "[JSON]" suffix while fetching, so callers get Python objects instead of JSON text
+sqlite3.register_converter("JSON", _convert_json)
+
+
+def connect_db(db_path, **kwargs) -> sqlite3.Connection:
+    """Open an SQLite connection with WAL journaling, the tuned PRAGMAs and a busy timeout applied.
+    Extra keyword arguments are passed through to sqlite3.connect.
+    """
+    kwargs.setdefault("timeout", _BUSY_TIMEOUT)
+    conn = sqlite3.connect(db_path, **kwargs)
+    key = str(db_path)
+    if key not in _WAL_PATHS:
+        conn.execute("PRAGMA journal_mode=WAL")
+        _WAL_PATHS.add(key)
+    conn.executescript(_PRAGMAS)
+    return conn
+
+
+def close_db(conn: sqlite3.Connection) -> None:
+    """Run PRAGMA optimize (best-effort) and close the connection"""
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass
+    conn.close()
+
+
+# Database paths whose schema has already been initialized by this process
+_DB_READY: set[str] = set()
+_DB_INIT_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _resolve_data_dir(public_dir_env: str) -> Path:
+    """Validate and cache the data directory for a given AGENTMESSAGE_PUBLIC_DATABLOCKS value"""
+    data_dir = Path(public_dir_env)
+    if data_dir.exists() and not data_dir.is_dir():
+        raise NotADirectoryError(f"AGENTMESSAGE_PUBLIC_DATABLOCKS points to a non-directory: {str(data_dir)}")
+    return data_dir
+
 
 def get_data_dir() -> Path:
     """Return the data directory path: $AGENTMESSAGE_PUBLIC_DATABLOCKS"""
     public_dir_env = os.getenv("AGENTMESSAGE_PUBLIC_DATABLOCKS")
     if not public_dir_env:
         raise EnvironmentError("AGENTMESSAGE_PUBLIC_DATABLOCKS environment variable is not set. Please define it in the MCP configuration file.")
-    data_dir = Path(public_dir_env)
-    if data_dir.exists() and not data_dir.is_dir():
-        raise NotADirectoryError(f"AGENTMESSAGE_PUBLIC_DATABLOCKS points to a non-directory: {str(data_dir)}")
-    return data_dir
+    return _resolve_data_dir(public_dir_env)
 
 
 def get_message_db_path() -> Path:
@@ -38,48 +115,369 @@ def get_message_db_path() -> Path:
 
 
 def init_message_history_db() -> Path:
-    """Initialize $AGENTMESSAGE_PUBLIC_DATABLOCKS/message_history.db and necessary tables and indexes"""
-    data_dir = get_data_dir()
-    data_dir.mkdir(parents=True, exist_ok=True)
-
+    """Initialize $AGENTMESSAGE_PUBLIC_DATABLOCKS/message_history.db and necessary tables and indexes.
+    The schema check runs once per process and database path; later calls only stat the file.
+    """
     db_path = get_message_db_path()
-    conn = sqlite3.connect(db_path)
+    key = str(db_path)
+    if key in _DB_READY and db_path.exists():
+        return db_path
+
+    with _DB_INIT_LOCK:
+        if key not in _DB_READY or not db_path.exists():
+            _create_message_history_db(db_path)
+            _DB_READY.add(key)
+    return db_path
+
+
+# Secondary indexes on message_history, as (name, column list).
+# (group_id, timestamp_ms, sender_did) serves the reply poll as an ordered integer range scan and
+# also covers group_id-only lookups as its leftmost prefix.
+_INDEXES = (
+    ("message_history_group_tsms_sender_idx", "group_id, timestamp_ms, sender_did"),
+    ("message_history_sender_did_idx", "sender_did"),
+    ("message_history_timestamp_idx", "timestamp"),
+)
+
+# Indexes from older schemas that are superseded by _INDEXES
+_OBSOLETE_INDEXES = ("message_history_group_id_idx", "message_history_group_ts_sender_idx")
+
+_MESSAGE_COLUMNS = (
+    "message_id, timestamp, sender_did, receiver_dids, group_id, message_data, mention_dids, read_status"
+)
+
+# The text timestamp is Beijing time (UTC+8); converts it to epoch milliseconds for older rows
+_TIMESTAMP_TEXT_TO_MS = "(CAST(strftime('%s', {}) AS INTEGER) - 8 * 3600) * 1000"
+
+# timestamp_ms of a message_history row ({0} is the row alias, e.g. NEW or m): rows written by
+# clients that predate the column carry its default 0, so fall back to the text timestamp
+_ROW_TIMESTAMP_MS = (
+    "(CASE WHEN {0}.timestamp_ms = 0 "
+    "THEN COALESCE(" + _TIMESTAMP_TEXT_TO_MS.format("{0}.timestamp") + ", 0) "
+    "ELSE {0}.timestamp_ms END)"
+)
+
+# Minified form of a JSON column value; values that are not valid JSON are kept as they are
+_COMPACT_JSON = "(CASE WHEN json_valid({0}) THEN json({0}) ELSE {0} END)"
+_JSON_COLUMNS = ("receiver_dids", "message_data", "mention_dids", "read_status")
+
+# message_recipients.read derived from a read_status JSON object: 0 only when the DID's entry is false
+_RECIPIENT_READ = (
+    "(CASE WHEN json_valid({status}) "
+    "THEN (CASE WHEN json_extract({status}, '$.\"' || {did} || '\"') = 0 THEN 0 ELSE 1 END) "
+    "ELSE 1 END)"
+)
+
+# message_recipients columns added after the table was introduced: (definition, value derived from
+# the message_history row m), used to migrate tables created by older versions
+_RECIPIENT_COLUMNS = {
+    "read": (
+        "INTEGER NOT NULL DEFAULT 0",
+        _RECIPIENT_READ.format(status="m.read_status", did="message_recipients.did"),
+    ),
+    "group_id": ("TEXT NOT NULL DEFAULT ''", "m.group_id"),
+    "timestamp_ms": ("INTEGER NOT NULL DEFAULT 0", _ROW_TIMESTAMP_MS.format("m")),
+}
+
+# Indexes on message_recipients from older schemas
+_OBSOLETE_RECIPIENT_INDEXES = ("message_recipients_did_idx", "message_recipients_unread_idx")
+
+# Fills message_recipients from every message_history row (one-off backfill)
+_BACKFILL_RECIPIENTS_SQL = f"""
+    INSERT OR IGNORE INTO message_recipients (message_id, did, read, group_id, timestamp_ms)
+    SELECT m.message_id, j.value, {_RECIPIENT_READ.format(status='m.read_status', did='j.value')},
+           m.group_id, {_ROW_TIMESTAMP_MS.format('m')}
+    FROM message_history m,
+         json_each(CASE WHEN json_valid(m.receiver_dids) THEN m.receiver_dids ELSE '[]' END) j
+    WHERE j.type = 'text'
+"""
+
+# Keeps message_recipients in step with message_history inside SQLite: every inserted message gets one
+# row per receiver, whichever code path (or older client sharing the file) wrote it. Older clients do
+# not set timestamp_ms, so the copied value is derived from the text timestamp for them.
+_RECIPIENTS_TRIGGER_SQL = f"""
+    CREATE TRIGGER IF NOT EXISTS message_history_recipients_insert
+    AFTER INSERT ON message_history
+    BEGIN
+        INSERT OR IGNORE INTO message_recipients (message_id, did, read, group_id, timestamp_ms)
+        SELECT NEW.message_id, j.value, {_RECIPIENT_READ.format(status='NEW.read_status', did='j.value')},
+               NEW.group_id, {_ROW_TIMESTAMP_MS.format('NEW')}
+        FROM json_each(CASE WHEN json_valid(NEW.receiver_dids) THEN NEW.receiver_dids ELSE '[]' END) j
+        WHERE j.type = 'text';
+    END
+"""
+
+# Mirrors read_status into message_recipients.read when a row's read_status is rewritten: mark_read
+# and older clients (and the visualization interface) alike, which only update message_history
+_READ_STATUS_TRIGGER_SQL = f"""
+    CREATE TRIGGER IF NOT EXISTS message_history_read_status_update
+    AFTER UPDATE OF read_status ON message_history
+    WHEN NEW.read_status IS NOT OLD.read_status
+    BEGIN
+        UPDATE message_recipients
+        SET read = {_RECIPIENT_READ.format(status='NEW.read_status', did='message_recipients.did')}
+        WHERE message_id = NEW.message_id
+          AND read <> {_RECIPIENT_READ.format(status='NEW.read_status', did='message_recipients.did')};
+    END
+"""
+
+# Fills message_history.timestamp_ms from the text timestamp for inserts that leave it at 0 (writers
+# that predate the column, or any that omit it), so range scans such as the reply poll see every row
+_TIMESTAMP_MS_TRIGGER_SQL = f"""
+    CREATE TRIGGER IF NOT EXISTS message_history_timestamp_ms_insert
+    AFTER INSERT ON message_history
+    WHEN NEW.timestamp_ms = 0
+    BEGIN
+        UPDATE message_history SET timestamp_ms = {_ROW_TIMESTAMP_MS.format('NEW')}
+        WHERE message_id = NEW.message_id;
+    END
+"""
+
+# PRAGMA user_version of the message database once the one-off data migrations below have run:
+# 1 = JSON columns minified, 2 = recipients trigger derives timestamp_ms and zero copies repaired,
+# 3 = message_history rows inserted with timestamp_ms 0 since the column was added repaired,
+# 4 = read flags left unread by read_status updates made before the update trigger existed repaired
+_DATA_VERSION = 4
+
+
+def _create_message_history_db(db_path: Path) -> None:
+    """Create the message_history table and indexes, migrating older schemas"""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # The file may have been removed and recreated; make sure the new one is switched to WAL
+    _WAL_PATHS.discard(str(db_path))
+    conn = connect_db(db_path)
     try:
-        cursor = conn.cursor()
+        create_schema(conn)
+        create_indexes(conn)
+        conn.commit()
+    finally:
+        close_db(conn)
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    """Create the message_history table (if missing) and add columns missing from older databases.
 
-        # Create message_history table
+    The checks and migrations run in one write transaction (committed by the caller), so processes
+    initializing the same file concurrently take turns: the later ones wait for the write lock and
+    then find the schema and user_version already up to date.
+    """
+    cursor = conn.cursor()
+    if not conn.in_transaction:
+        cursor.execute("BEGIN IMMEDIATE")
+
+    # Create message_history table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS message_history (
+            message_id   TEXT PRIMARY KEY,
+            timestamp    TEXT NOT NULL, -- Beijing time "%Y-%m-%d %H:%M:%S", for display
+            sender_did   TEXT NOT NULL,
+            receiver_dids TEXT NOT NULL, -- JSON array string
+            group_id     TEXT NOT NULL,
+            message_data  TEXT NOT NULL, -- JSON object string
+            mention_dids  TEXT NOT NULL, -- JSON array string
+            read_status   TEXT NOT NULL DEFAULT '{}', -- JSON object string; record read status for each receiver
+            timestamp_ms INTEGER NOT NULL DEFAULT 0 -- epoch milliseconds; used for ordering and range scans
+        ) WITHOUT ROWID
+    """)
+
+    # Check whether the read_status column needs to be added (migrate existing database)
+    cursor.execute("PRAGMA table_info(message_history)")
+    columns = [row[1] for row in cursor.fetchall()]
+    if 'read_status' not in columns:
+        cursor.execute("ALTER TABLE message_history ADD COLUMN read_status TEXT NOT NULL DEFAULT '{}'")
+    if 'timestamp_ms' not in columns:
+        cursor.execute("ALTER TABLE message_history ADD COLUMN timestamp_ms INTEGER NOT NULL DEFAULT 0")
+        cursor.execute(
+            "UPDATE message_history SET timestamp_ms = "
+            f"COALESCE({_TIMESTAMP_TEXT_TO_MS.format('timestamp')}, 0)"
+        )
+
+    # Rebuild rowid tables from older schemas as WITHOUT ROWID, so message_id lookups hit the row directly
+    table_sql = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'message_history'"
+    ).fetchone()[0]
+    if "WITHOUT ROWID" not in table_sql.upper():
+        _rebuild_without_rowid(conn, table_sql)
+
+    # Older versions stored the JSON columns with json.dumps' default ", "/": " separators; re-encode them
+    # compactly once so rows are smaller and more of the table stays in the page cache
+    data_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if data_version < 1:
+        assignments = ", ".join(f"{col} = {_COMPACT_JSON.format(col)}" for col in _JSON_COLUMNS)
+        changed = " OR ".join(f"{col} <> {_COMPACT_JSON.format(col)}" for col in _JSON_COLUMNS)
+        cursor.execute(f"UPDATE message_history SET {assignments} WHERE {changed}")
+
+    # message_recipients: one row per (message, receiver DID) with that receiver's read flag, so finding
+    # a DID's unread messages is an index seek instead of scanning and parsing receiver_dids/read_status.
+    # read mirrors read_status (0 only where the receiver's entry is false); group_id and timestamp_ms
+    # are copied from the message so the DID -> groups lookups never touch message_history.
+    has_recipients = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'message_recipients'"
+    ).fetchone()
+    if not has_recipients:
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS message_history (
-                message_id   TEXT PRIMARY KEY,
-                timestamp    TEXT NOT NULL,
-                sender_did   TEXT NOT NULL,
-                receiver_dids TEXT NOT NULL, -- JSON array string
-                group_id     TEXT NOT NULL,
-                message_data  TEXT NOT NULL, -- JSON object string
-                mention_dids  TEXT NOT NULL, -- JSON array string
-                read_status   TEXT NOT NULL DEFAULT '{}' -- JSON object string; record read status for each receiver
+            CREATE TABLE IF NOT EXISTS message_recipients (
+                message_id   TEXT NOT NULL,
+                did          TEXT NOT NULL,
+                read         INTEGER NOT NULL DEFAULT 0, -- 1 once the receiver has read the message
+                group_id     TEXT NOT NULL DEFAULT '', -- copy of message_history.group_id
+                timestamp_ms INTEGER NOT NULL DEFAULT 0, -- copy of message_history.timestamp_ms
+                PRIMARY KEY (message_id, did)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute(_BACKFILL_RECIPIENTS_SQL)
+    else:
+        # Tables created by older versions: add and backfill the columns they lack
+        cursor.execute("PRAGMA table_info(message_recipients)")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column, (definition, value) in _RECIPIENT_COLUMNS.items():
+            if column in existing:
+                continue
+            cursor.execute(f"ALTER TABLE message_recipients ADD COLUMN {column} {definition}")
+            cursor.execute(f"""
+                UPDATE message_recipients
+                SET {column} = (
+                    SELECT {value} FROM message_history m WHERE m.message_id = message_recipients.message_id
+                )
+            """)
+    if data_version < 2:
+        # Replace the trigger from before timestamp_ms was derived for older clients (in the same
+        # transaction, so no insert slips in between) and repair the zero copies it made
+        cursor.execute("DROP TRIGGER IF EXISTS message_history_recipients_insert")
+        cursor.execute(f"""
+            UPDATE message_recipients
+            SET timestamp_ms = COALESCE((
+                SELECT {_ROW_TIMESTAMP_MS.format('m')} FROM message_history m
+                WHERE m.message_id = message_recipients.message_id
+            ), 0)
+            WHERE timestamp_ms = 0
+        """)
+    cursor.execute(_RECIPIENTS_TRIGGER_SQL)
+    cursor.execute(_READ_STATUS_TRIGGER_SQL)
+    cursor.execute(_TIMESTAMP_MS_TRIGGER_SQL)
+    if data_version < 3:
+        # The column backfill ran only when timestamp_ms was added; rows inserted without it since then
+        # still hold 0 (the trigger above covers new ones)
+        cursor.execute(f"UPDATE message_history AS m SET timestamp_ms = {_ROW_TIMESTAMP_MS.format('m')} "
+                       "WHERE timestamp_ms = 0")
+    if data_version < 4:
+        cursor.execute(f"""
+            UPDATE message_recipients
+            SET read = 1
+            WHERE read = 0 AND EXISTS (
+                SELECT 1 FROM message_history m
+                WHERE m.message_id = message_recipients.message_id
+                  AND {_RECIPIENT_READ.format(status='m.read_status', did='message_recipients.did')} = 1
             )
         """)
+    if data_version < _DATA_VERSION:
+        cursor.execute(f"PRAGMA user_version = {_DATA_VERSION}")
+    for name in _OBSOLETE_RECIPIENT_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS message_recipients_unread_ts_idx "
+        "ON message_recipients(did, timestamp_ms, group_id) WHERE read = 0"
+    )
 
-        # Check whether the read_status column needs to be added (migrate existing database)
-        cursor.execute("PRAGMA table_info(message_history)")
-        columns = [row[1] for row in cursor.fetchall()]
-        if 'read_status' not in columns:
-            cursor.execute("ALTER TABLE message_history ADD COLUMN read_status TEXT NOT NULL DEFAULT '{}'")
 
-        # Common indexes (SQLite requires separate CREATE INDEX statements; cannot inline them in CREATE TABLE)
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS message_history_group_id_idx ON message_history(group_id)"
-        )
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS message_history_sender_did_idx ON message_history(sender_did)"
-        )
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS message_history_timestamp_idx ON message_history(timestamp)"
-        )
+def _rebuild_without_rowid(conn: sqlite3.Connection, table_sql: str) -> None:
+    """Copy message_history into a WITHOUT ROWID table of the same definition and swap it in.
+
+    Indexes are dropped along with the old table; create_indexes() recreates them.
+    """
+    columns = f"{_MESSAGE_COLUMNS}, timestamp_ms"
+    new_sql = table_sql.replace("message_history", "message_history_new", 1).rstrip() + " WITHOUT ROWID"
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute("DROP TABLE IF EXISTS message_history_new")
+    conn.execute(new_sql)
+    conn.execute(f"INSERT INTO message_history_new ({columns}) SELECT {columns} FROM message_history")
+    conn.execute("DROP TABLE message_history")
+    conn.execute("ALTER TABLE message_history_new RENAME TO message_history")
+
+
+def create_indexes(conn: sqlite3.Connection) -> None:
+    """Create the secondary indexes on message_history and drop superseded ones"""
+    # SQLite requires separate CREATE INDEX statements; cannot inline them in CREATE TABLE
+    for name, columns in _INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON message_history({columns})")
+    for name in _OBSOLETE_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def drop_indexes(conn: sqlite3.Connection) -> None:
+    """Drop the secondary indexes on message_history (the primary key is kept)"""
+    for name, _ in _INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+# Built once at import so every send hands the statement cache the same SQL text
+_INSERT_MESSAGE_SQL = f"""
+    INSERT INTO message_history ({_MESSAGE_COLUMNS}, timestamp_ms)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7,
+            (SELECT json_group_object(value, json('false'))
+             FROM (SELECT DISTINCT value FROM json_each(?4))),
+            ?8)
+"""
+
+
+def insert_messages(conn: sqlite3.Connection, rows) -> None:
+    """Insert newly sent messages on conn without committing.
+
+    Each row is (message_id, timestamp, sender_did, receiver_dids, group_id, message_data,
+    mention_dids, timestamp_ms) with the JSON columns already serialized. read_status is built by
+    SQLite from receiver_dids (every receiver unread) rather than serialized again in Python, and
+    the insert trigger gives each receiver a message_recipients row (mention_dids is always a subset
+    of receiver_dids).
+    """
+    conn.executemany(_INSERT_MESSAGE_SQL, rows)
+
+
+def mark_read(conn: sqlite3.Connection, message_ids, reader_did: str) -> None:
+    """Mark messages read for reader_did on conn without committing.
 
+    Sets read_status[reader_did] = true; the read_status update trigger sets the matching
+    message_recipients.read flag. message_ids is passed as one JSON array so the statement keeps a
+    fixed shape for the statement cache.
+    """
+    conn.execute(
+        """
+        UPDATE message_history
+        SET read_status = json_set(CASE WHEN json_valid(read_status) THEN read_status ELSE '{}' END, ?1, json('true'))
+        WHERE message_id IN (SELECT value FROM json_each(?2))
+        """,
+        (f'$."{reader_did}"', jsonutil.dumps(list(message_ids))),
+    )
+
+
+def bulk_import(rows) -> int:
+    """Insert many message_history rows at once, e.g. when migrating old history or replaying transcripts.
+
+    Each row is a tuple in column order: (message_id, timestamp, sender_did, receiver_dids, group_id,
+    message_data, mention_dids, read_status), with the JSON columns already serialized (they are
+    stored minified); timestamp_ms is derived from the text timestamp. Secondary indexes are dropped
+    before the load and rebuilt afterwards inside the same transaction, which is much faster than
+    maintaining them row by row. Rows whose message_id already exists are skipped. Returns the
+    number of rows inserted.
+    """
+    db_path = init_message_history_db()
+    conn = connect_db(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        drop_indexes(conn)
+        receivers, data, mentions, status = (_COMPACT_JSON.format(p) for p in ("?4", "?6", "?7", "?8"))
+        # rowcount counts only message_history rows, not the message_recipients rows added by the trigger
+        inserted = conn.executemany(
+            f"INSERT OR IGNORE INTO message_history ({_MESSAGE_COLUMNS}, timestamp_ms) "
+            f"VALUES (?1, ?2, ?3, {receivers}, ?5, {data}, {mentions}, {status}, {_TIMESTAMP_TEXT_TO_MS.format('?2')})",
+            rows,
+        ).rowcount
+        create_indexes(conn)
         conn.commit()
+        return inserted
+    except BaseException:
+        conn.rollback()
+        raise
     finally:
-        conn.close()
-
-    return db_path
\ No newline at end of file
+        close_db(conn)
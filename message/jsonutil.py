@@ -0,0 +1,33 @@
+"""JSON encode/decode helpers for the message_history columns
+- Uses orjson when it is installed (pip install agentmessage[speedups]) and falls back to the
+  stdlib json module otherwise
+- dumps() returns str, keeps non-ASCII characters as-is (like ensure_ascii=False) and writes
+  compact separators
+- Values orjson rejects (e.g. integers beyond 64 bits) are encoded by the stdlib instead, so
+  callers see the same errors as with json.dumps
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj, sort_keys: bool = False) -> str:
+    """Serialize obj to a JSON string"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(obj, option=option).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"))
+
+
+def loads(data):
+    """Parse a JSON str/bytes value"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,186 @@
+"""SQLite connection pool shared across message sends and polls
+- One read-write connection per database file, serialized by a lock
+- Up to MAX_READERS read-only connections per database file, handed out from a queue
+- Connections are opened lazily through message.db.connect_db (WAL + tuned PRAGMAs) and reused
+  for the lifetime of the process, so the page cache stays warm between calls
+
+Connections are created with check_same_thread=False because callers run the blocking work in
+worker threads (asyncio.to_thread); a connection is only ever used by one holder at a time.
+
+Change notification: Python's sqlite3 module does not expose sqlite3_update_hook, so writers in
+this process call notify(key) after committing and waiters blocked in subscribe()'s event wake up
+immediately. Writes made by other processes are not observed; waiters keep a polling fallback.
+"""
+
+import asyncio
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from message.db import connect_db, close_db
+
+MAX_READERS = 4
+# Per-connection prepared statement cache; pooled connections live for the whole process
+_CACHED_STATEMENTS = 256
+
+
+class ConnectionPool:
+    """Lazily opened, reusable connections to a single SQLite database file"""
+
+    def __init__(self, db_path: str, max_readers: int = MAX_READERS):
+        self.db_path = db_path
+        self._max_readers = max_readers
+        self._readers: queue.Queue[sqlite3.Connection] = queue.Queue()
+        self._opened_readers = 0
+        self._readers_lock = threading.Lock()
+        self._writer: sqlite3.Connection | None = None
+        self._writer_lock = threading.Lock()
+
+    def _open(self, readonly: bool) -> sqlite3.Connection:
+        conn = connect_db(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=_CACHED_STATEMENTS,
+            detect_types=sqlite3.PARSE_COLNAMES,
+        )
+        if readonly:
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def get_rw(self) -> Iterator[sqlite3.Connection]:
+        """Borrow the read-write connection; uncommitted work is rolled back on error"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._open(readonly=False)
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def acquire_ro(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection, opening a new one while below the reader limit"""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._readers_lock:
+                can_open = self._opened_readers < self._max_readers
+                if can_open:
+                    self._opened_readers += 1
+            if can_open:
+                try:
+                    conn = self._open(readonly=True)
+                except BaseException:
+                    with self._readers_lock:
+                        self._opened_readers -= 1
+                    raise
+            else:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            # End the implicit read transaction so the connection does not pin an old WAL snapshot
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def close(self) -> None:
+        """Close every idle connection held by the pool"""
+        with self._writer_lock:
+            if self._writer is not None:
+                close_db(self._writer)
+                self._writer = None
+        while True:
+            try:
+                close_db(self._readers.get_nowait())
+            except queue.Empty:
+                break
+        with self._readers_lock:
+            self._opened_readers = 0
+
+
+_POOLS: dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(db_path) -> ConnectionPool:
+    """Return the process-wide pool for db_path, replacing it if the file has been removed"""
+    key = str(db_path)
+    pool = _POOLS.get(key)
+    if pool is not None and os.path.exists(key):
+        return pool
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is not None and not os.path.exists(key):
+            pool.close()
+            pool = None
+        if pool is None:
+            pool = ConnectionPool(key)
+            _POOLS[key] = pool
+        return pool
+
+
+def get_rw(db_path):
+    """Context manager yielding the shared read-write connection for db_path"""
+    return get_pool(db_path).get_rw()
+
+
+def acquire_ro(db_path):
+    """Context manager yielding a pooled read-only connection for db_path"""
+    return get_pool(db_path).acquire_ro()
+
+
+def close_all() -> None:
+    """Close all pooled connections (registered with atexit)"""
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.close()
+        _POOLS.clear()
+
+
+atexit.register(close_all)
+
+
+_WAITERS: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+_WAITERS_LOCK = threading.Lock()
+
+
+def subscribe(key: str) -> asyncio.Event:
+    """Register an event (bound to the running loop) that notify(key) will set"""
+    event = asyncio.Event()
+    entry = (asyncio.get_running_loop(), event)
+    with _WAITERS_LOCK:
+        _WAITERS.setdefault(key, set()).add(entry)
+    return event
+
+
+def unsubscribe(key: str, event: asyncio.Event) -> None:
+    """Remove an event previously returned by subscribe(key)"""
+    with _WAITERS_LOCK:
+        waiters = _WAITERS.get(key)
+        if not waiters:
+            return
+        for entry in [w for w in waiters if w[1] is event]:
+            waiters.discard(entry)
+        if not waiters:
+            del _WAITERS[key]
+
+
+def notify(*keys: str) -> None:
+    """Wake every waiter subscribed to any of keys; safe to call from any thread"""
+    with _WAITERS_LOCK:
+        targets = [entry for key in keys for entry in _WAITERS.get(key, ())]
+    for loop, event in targets:
+        if loop.is_closed():
+            continue
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # Loop closed between the check and the call
+            pass
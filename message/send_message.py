@@ -1,16 +1,151 @@
 import os
 import re
-import json
 import time
 import asyncio
 import hashlib
 import sqlite3
+import threading
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
 
-from message.db import init_message_history_db
+from message.db import init_message_history_db, mark_read
+from message import jsonutil, pool, writer
 from identity.identity_manager import IdentityManager
 
+# Message timestamps are recorded in Beijing time
+BEIJING = timezone(timedelta(hours=8))
+
+# message_data fields scanned for @mentions
+_TEXT_FIELDS = ("text", "caption", "message", "content")
+_AT_ALL_RE = re.compile(r"(^|\s)@all(\b|$)")
+
+
+def _fetchall(db_path, sql: str, params: tuple = ()) -> list:
+    """Run a read query on a pooled read-only connection (blocking; call via asyncio.to_thread)"""
+    with pool.acquire_ro(db_path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+@lru_cache(maxsize=1024)
+def _mention_matcher(patterns: frozenset) -> tuple:
+    """Compile "@DID"/"@name" -> DID pairs into one alternation regex and its lookup table.
+
+    Longer keys come first so "@Carol Smith" wins over "@Carol"; the whole text is then scanned once.
+    """
+    targets = dict(patterns)
+    alternation = "|".join(re.escape(key) for key in sorted(targets, key=len, reverse=True))
+    return re.compile(alternation), targets
+
+
+@lru_cache(maxsize=1024)
+def _group_id(dids: frozenset) -> str:
+    """"grp_" + first 16 hex chars of SHA-256 over the sorted participant DIDs joined by "|".
+
+    Stays on SHA-256 rather than a faster hash: existing rows and the visualization interface derive
+    the same id for a conversation, so changing the hash would split every ongoing group. Conversations
+    repeat, so results are memoized and the digest is computed once per participant set.
+    """
+    group_basis = "|".join(sorted(dids))
+    return f"grp_{hashlib.sha256(group_basis.encode('utf-8')).hexdigest()[:16]}"
+
+
+@lru_cache(maxsize=4096)
+def _lookup_receivers(id_db_path: str, dids_key: frozenset) -> tuple:
+    """identities rows for the given DIDs (cached; call through _receiver_rows)"""
+    dids = tuple(dids_key)
+    return tuple(_fetchall(
+        id_db_path,
+        """
+        SELECT did, name, description, capabilities, created_at, updated_at
+        FROM identities
+        WHERE did IN ({})
+        """.format(",".join("?" for _ in dids)),
+        dids,
+    ))
+
+
+# (mtime_ns, size) of identities.db and its WAL when _lookup_receivers was last valid
+_identities_stamp = None
+# Serializes the stamp check with cache_clear so two threads cannot interleave between them
+_identities_stamp_lock = threading.Lock()
+
+
+def _file_stamp(db_path: Path) -> tuple:
+    stamp = []
+    for path in (db_path, db_path.with_name(db_path.name + "-wal")):
+        try:
+            st = path.stat()
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def _receiver_rows(id_db_path: Path, dids: list[str]) -> tuple:
+    """Look up identities rows for dids, reusing cached results until identities.db changes (blocking)
+
+    identities.db is also written by other processes, so a connection update hook would not see every
+    change; the cache is dropped whenever the database or its WAL file changes on disk instead.
+    """
+    global _identities_stamp
+    stamp = _file_stamp(id_db_path)
+    with _identities_stamp_lock:
+        if stamp != _identities_stamp:
+            _lookup_receivers.cache_clear()
+            _identities_stamp = stamp
+    return _lookup_receivers(str(id_db_path), frozenset(dids))
+
+
+# Identities returned in error payloads (most recently updated first)
+_IDENTITY_PAGE_SIZE = 50
+
+
+def _identity_page(id_db_path) -> tuple[int, list]:
+    """Return (total identity count, latest _IDENTITY_PAGE_SIZE rows) from one read snapshot (blocking)"""
+    with pool.acquire_ro(id_db_path) as conn:
+        conn.execute("BEGIN")
+        count = conn.execute("SELECT COUNT(*) FROM identities").fetchone()[0]
+        rows = conn.execute(
+            """
+            SELECT did, name, description, capabilities, created_at, updated_at
+            FROM identities
+            ORDER BY updated_at DESC
+            LIMIT ?
+            """,
+            (_IDENTITY_PAGE_SIZE,),
+        ).fetchall()
+        return count, rows
+
+
+def _identity_row_to_dict(row: tuple) -> dict:
+    """Convert an identities row into the dict returned in error payloads"""
+    did, name, description, capabilities_text, created_at, updated_at = row
+    try:
+        capabilities = jsonutil.loads(capabilities_text) if capabilities_text else []
+        if not isinstance(capabilities, list):
+            capabilities = []
+    except Exception:
+        capabilities = []
+    return {
+        "did": did,
+        "name": name,
+        "description": description,
+        "capabilities": capabilities,
+        "created_at": created_at,
+        "updated_at": updated_at,
+    }
+
+
+def _mark_read(db_path, message_ids: list[str], reader_did: str) -> None:
+    """Mark the given messages read for reader_did in one transaction (blocking)"""
+    if not message_ids:
+        return
+    with pool.get_rw(db_path) as conn:
+        mark_read(conn, message_ids, reader_did)
+        conn.commit()
+
+
 async def _send_message(
     sender_did: str,
     receiver_dids: list[str],
@@ -34,7 +169,8 @@ async def _send_message(
             "message": "message_data must be an object"
         }
     
-    # New: Verify if all receiver_dids exist in identities.db
+    # Verify receivers against identities.db with a single query; the existence check, the
+    # self-inclusion check and @name resolution below are all derived from this one result set
     try:
         public_dir_env = os.getenv("AGENTMESSAGE_PUBLIC_DATABLOCKS")
         if not public_dir_env:
@@ -50,206 +186,84 @@ async def _send_message(
                 "expected_path": str(id_db_path)
             }
         
-        # Query receiver DIDs existence in identities.db
         uniq_receivers = list(dict.fromkeys(receiver_dids))  # Remove duplicates while preserving order
-        placeholders = ",".join("?" for _ in uniq_receivers)
-        conn_ids = sqlite3.connect(id_db_path)
-        try:
-            cur = conn_ids.cursor()
-            # Query existing DIDs in database
-            cur.execute(
-                f"SELECT did FROM identities WHERE did IN ({placeholders})",
-                tuple(uniq_receivers),
-            )
-            existing_dids = {row[0] for row in cur.fetchall()}
-            
-            # Find non-existing DIDs
-            missing_dids = [did for did in uniq_receivers if did not in existing_dids]
-            
-            if missing_dids:
-                # If there are non-existing DIDs, get all identity records for verification
-                cur.execute(
-                    """
-                    SELECT did, name, description, capabilities, created_at, updated_at
-                    FROM identities
-                    ORDER BY datetime(updated_at) DESC
-                    """
-                )
-                all_rows = cur.fetchall()
-                
-                all_identities = []
-                for did, name, description, capabilities_text, created_at, updated_at in all_rows:
-                    try:
-                        capabilities = json.loads(capabilities_text) if capabilities_text else []
-                        if not isinstance(capabilities, list):
-                            capabilities = []
-                    except Exception:
-                        capabilities = []
-                    
-                    all_identities.append({
-                        "did": did,
-                        "name": name,
-                        "description": description,
-                        "capabilities": capabilities,
-                        "created_at": created_at,
-                        "updated_at": updated_at,
-                    })
-                
-                return {
-                    "status": "error",
-                    "message": f"There are {len(missing_dids)} DIDs in the receiver list that do not exist in the identities.db database. Please select the correct receiver DIDs from the identity records below and resend the message.",
-                    "missing_dids": missing_dids,
-                    "receiver_dids": receiver_dids,
-                    "identities": all_identities,
-                    "database_path": str(id_db_path)
-                }
-        finally:
-            conn_ids.close()
-    except Exception as e:
-        return {
-            "status": "error",
-            "message": f"Failed to verify receiver DIDs: {str(e)}",
-            "receiver_dids": receiver_dids
-        }
+        receiver_rows = await asyncio.to_thread(_receiver_rows, id_db_path, uniq_receivers)
+        existing_dids = {row[0] for row in receiver_rows}
 
-    # New: Exclude sender from receiver list validation
-    if sender_did in receiver_dids:
-        try:
-            public_dir_env = os.getenv("AGENTMESSAGE_PUBLIC_DATABLOCKS")
-            if not public_dir_env:
-                return {
-                    "status": "error",
-                    "message": "AGENTMESSAGE_PUBLIC_DATABLOCKS environment variable not set, please add this environment variable definition in MCP configuration file"
-                }
-            id_db_path = Path(public_dir_env) / "identities.db"
-            if not id_db_path.exists():
-                return {
-                    "status": "error",
-                    "message": "identities.db not found",
-                    "expected_path": str(id_db_path),
-                    "receiver_dids": receiver_dids
-                }
-            
-            # Query receivers (including sender) identity records in identities.db
-            uniq_receivers = list(dict.fromkeys(receiver_dids))
-            placeholders = ",".join("?" for _ in uniq_receivers)
-            conn_ids = sqlite3.connect(id_db_path)
-            try:
-                cur = conn_ids.cursor()
-                cur.execute(
-                    f"""
-                    SELECT did, name, description, capabilities, created_at, updated_at
-                    FROM identities
-                    WHERE did IN ({placeholders})
-                    """,
-                    tuple(uniq_receivers),
-                )
-                rows = cur.fetchall()
-            finally:
-                conn_ids.close()
-            
-            identities = []
-            for did, name, description, capabilities_text, created_at, updated_at in rows:
-                try:
-                    capabilities = json.loads(capabilities_text) if capabilities_text else []
-                    if not isinstance(capabilities, list):
-                        capabilities = []
-                except Exception:
-                    capabilities = []
-                identities.append({
-                    "did": did,
-                    "name": name,
-                    "description": description,
-                    "capabilities": capabilities,
-                    "created_at": created_at,
-                    "updated_at": updated_at,
-                })
-            
+        # Find non-existing DIDs
+        missing_dids = [did for did in uniq_receivers if did not in existing_dids]
+
+        if missing_dids:
+            # Error path only: get the most recent identity records so the caller can pick valid receivers
+            identity_count, all_rows = await asyncio.to_thread(_identity_page, id_db_path)
             return {
                 "status": "error",
-                "message": "Receiver list contains sender (you are sending a message to yourself). Please confirm the receiver identity information based on the returned identity records and remove your own DID from the receiver list before retrying.",
+                "message": f"There are {len(missing_dids)} DIDs in the receiver list that do not exist in the identities.db database. Please select the correct receiver DIDs from the identity records below and resend the message.",
+                "missing_dids": missing_dids,
                 "receiver_dids": receiver_dids,
-                "sender_did": sender_did,
-                "identities": identities,
+                "identities": [_identity_row_to_dict(row) for row in all_rows],
+                "identity_count": identity_count,
                 "database_path": str(id_db_path)
             }
-        except Exception as e:
+
+        # Exclude sender from receiver list
+        if sender_did in existing_dids:
             return {
                 "status": "error",
-                "message": f"Failed to validate receiver list: {str(e)}",
+                "message": "Receiver list contains sender (you are sending a message to yourself). Please confirm the receiver identity information based on the returned identity records and remove your own DID from the receiver list before retrying.",
                 "receiver_dids": receiver_dids,
-                "sender_did": sender_did
+                "sender_did": sender_did,
+                "identities": [_identity_row_to_dict(row) for row in receiver_rows],
+                "database_path": str(id_db_path)
             }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Failed to verify receiver DIDs: {str(e)}",
+            "receiver_dids": receiver_dids
+        }
+
+    # Receiver name -> DID mapping used for @name mentions
+    name_to_did = {name: did for did, name, *_ in receiver_rows if isinstance(name, str)}
     
     # Generate timestamp and ID
-    now_utc = datetime.now(timezone.utc)
-    beijing_time = now_utc.astimezone(timezone(timedelta(hours=8)))
+    beijing_time = datetime.now(BEIJING)
     timestamp_str = beijing_time.strftime("%Y-%m-%d %H:%M:%S")
-    epoch_ms = int(now_utc.timestamp() * 1000)
+    epoch_ms = int(beijing_time.timestamp() * 1000)
     
     # Calculate group_id (based on DID set hash)
-    unique_dids = sorted(set([sender_did] + receiver_dids))
-    group_basis = "|".join(unique_dids)
-    group_hash = hashlib.sha256(group_basis.encode("utf-8")).hexdigest()[:16]
-    group_id = f"grp_{group_hash}"
+    group_id = _group_id(frozenset([sender_did, *receiver_dids]))
     
     # Generate message_id (timestamp + content hash)
+    # The canonical JSON is encoded once and reused for both the id hash and the stored message_data
     try:
-        msg_payload_preview = json.dumps(message_data, ensure_ascii=False, sort_keys=True)
+        message_data_json = jsonutil.dumps(message_data, sort_keys=True)
     except Exception:
-        msg_payload_preview = str(message_data)
+        message_data_json = None
+    msg_payload_preview = message_data_json if message_data_json is not None else str(message_data)
     mid_basis = f"{sender_did}|{','.join(sorted(receiver_dids))}|{epoch_ms}|{msg_payload_preview}"
-    message_id = f"msg_{epoch_ms}_{hashlib.sha256(mid_basis.encode('utf-8')).hexdigest()[:12]}"
+    message_id = f"msg_{epoch_ms}_{hashlib.blake2b(mid_basis.encode('utf-8'), digest_size=6).hexdigest()}"
     
     # Parse @ mentions
     mention_dids: list[str] = []
     try:
         # Extract text candidate fields
-        text_candidates = []
-        if "text" in message_data and isinstance(message_data["text"], str):
-            text_candidates.append(message_data["text"])
-        if "caption" in message_data and isinstance(message_data["caption"], str):
-            text_candidates.append(message_data["caption"])
-        if "message" in message_data and isinstance(message_data["message"], str):
-            text_candidates.append(message_data["message"])
-        if "content" in message_data and isinstance(message_data["content"], str):
-            text_candidates.append(message_data["content"])
-        combined_text = "\n".join(text_candidates)
+        combined_text = "\n".join(
+            value for value in (message_data.get(field) for field in _TEXT_FIELDS) if isinstance(value, str)
+        )
         
         # @all
-        if re.search(r"(^|\s)@all(\b|$)", combined_text):
+        if "@" not in combined_text:
+            # No mention marker at all: skip the regex scans
+            pass
+        elif _AT_ALL_RE.search(combined_text):
             mention_dids = list(dict.fromkeys(receiver_dids))  # Remove duplicates while preserving order
         else:
-            # First match based on DID
-            mentioned = set()
-            for did in receiver_dids:
-                if f"@{did}" in combined_text:
-                    mentioned.add(did)
-            
-            # Then match based on name (read receiver name mapping from identities.db)
-            try:
-                public_dir_env = os.getenv("AGENTMESSAGE_PUBLIC_DATABLOCKS")
-                if public_dir_env:
-                    id_db_path = Path(public_dir_env) / "identities.db"
-                    if id_db_path.exists():
-                        conn_ids = sqlite3.connect(id_db_path)
-                        try:
-                            cursor_ids = conn_ids.cursor()
-                            placeholders = ",".join("?" for _ in receiver_dids)
-                            cursor_ids.execute(
-                                f"SELECT did, name FROM identities WHERE did IN ({placeholders})",
-                                tuple(receiver_dids),
-                            )
-                            did_to_name = {row[0]: row[1] for row in cursor_ids.fetchall()}
-                            name_to_did = {name: did for did, name in did_to_name.items() if isinstance(name, str)}
-                            for name, did in name_to_did.items():
-                                if f"@{name}" in combined_text:
-                                    mentioned.add(did)
-                        finally:
-                            conn_ids.close()
-            except Exception:
-                # Name resolution failure does not affect sending
-                pass
+            # One pass over the text for every receiver DID and name
+            patterns = {f"@{did}": did for did in receiver_dids}
+            patterns.update((f"@{name}", did) for name, did in name_to_did.items() if name)
+            mention_re, targets = _mention_matcher(frozenset(patterns.items()))
+            mentioned = {targets[match] for match in mention_re.findall(combined_text)}
             
             mention_dids = list(mentioned)
     except Exception:
@@ -260,32 +274,23 @@ async def _send_message(
         # Initialize database (internally checks if AGENTMESSAGE_PUBLIC_DATABLOCKS is set)
         db_path = init_message_history_db()
         
-        # Initialize read_status: mark all receivers as unread (false)
+        # Initialize read_status: mark all receivers as unread (false); the stored JSON is built by SQLite
         read_status = {did: False for did in receiver_dids}
         
-        conn = sqlite3.connect(db_path)
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO message_history
-                (message_id, timestamp, sender_did, receiver_dids, group_id, message_data, mention_dids, read_status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    message_id,
-                    timestamp_str,
-                    sender_did,
-                    json.dumps(receiver_dids, ensure_ascii=False),
-                    group_id,
-                    json.dumps(message_data, ensure_ascii=False),
-                    json.dumps(mention_dids, ensure_ascii=False),
-                    json.dumps(read_status, ensure_ascii=False),
-                ),
-            )
-            conn.commit()
-        finally:
-            conn.close()
+        # Batched with concurrent sends into one commit; waiters on this group are notified afterwards
+        await writer.insert_message(
+            db_path,
+            (
+                message_id,
+                timestamp_str,
+                sender_did,
+                jsonutil.dumps(receiver_dids),
+                group_id,
+                message_data_json if message_data_json is not None else jsonutil.dumps(message_data),
+                jsonutil.dumps(mention_dids),
+                epoch_ms,
+            ),
+        )
         
         # Base return data
         base_data = {
@@ -312,68 +317,55 @@ async def _send_message(
         start_time = time.time()
         replies = []
         
-        while time.time() - start_time < timeout:
-            # Poll to check if all receivers have replied
-            conn = sqlite3.connect(db_path)
-            try:
-                cursor = conn.cursor()
+        # Woken early by in-process writes to this group; replies from other processes are picked up by polling
+        reply_event = pool.subscribe(group_id)
+        try:
+            while time.time() - start_time < timeout:
+                # Poll to check if all receivers have replied
                 # Find new messages sent later than the original message in the same group
-                cursor.execute(
+                new_messages = await asyncio.to_thread(
+                    _fetchall,
+                    db_path,
                     """
                     SELECT message_id, timestamp, sender_did, message_data
                     FROM message_history
                     WHERE group_id = ? 
-                    AND timestamp > ?
+                    AND timestamp_ms > ?
                     AND sender_did IN ({})
-                    ORDER BY timestamp ASC
+                    ORDER BY timestamp_ms ASC
                     """.format(",".join("?" for _ in receiver_dids)),
-                    (group_id, timestamp_str, *receiver_dids),
+                    (group_id, epoch_ms, *receiver_dids),
                 )
-                new_messages = cursor.fetchall()
-                
+
                 # Collect replies and check if all receivers have replied
                 replied_dids = set()
+                new_reply_ids = []
                 for msg_id, msg_ts, msg_sender, msg_data_json in new_messages:
                     if msg_sender in receiver_dids:
                         replied_dids.add(msg_sender)
                         # Check if this reply has already been added
                         if not any(r["message_id"] == msg_id for r in replies):
                             try:
-                                msg_data = json.loads(msg_data_json) if msg_data_json else {}
+                                msg_data = jsonutil.loads(msg_data_json) if msg_data_json else {}
                             except Exception:
                                 msg_data = {}
-                            
+                        
                             replies.append({
                                 "message_id": msg_id,
                                 "timestamp": msg_ts,
                                 "sender_did": msg_sender,
                                 "message_data": msg_data
                             })
-                            
-                            # New: Mark this "reply message" as read for current user
-                            # Current user DID in this function is sender_did
-                            try:
-                                cursor.execute(
-                                    "SELECT read_status FROM message_history WHERE message_id = ?",
-                                    (msg_id,),
-                                )
-                                row = cursor.fetchone()
-                                try:
-                                    rs = json.loads(row[0]) if row and row[0] else {}
-                                except Exception:
-                                    rs = {}
-                                
-                                if not rs.get(sender_did, False):
-                                    rs[sender_did] = True
-                                    cursor.execute(
-                                        "UPDATE message_history SET read_status = ? WHERE message_id = ?",
-                                        (json.dumps(rs, ensure_ascii=False), msg_id),
-                                    )
-                                    conn.commit()
-                            except Exception:
-                                # Error does not affect main flow
-                                pass
-                    
+                            new_reply_ids.append(msg_id)
+                
+                # New: Mark the new "reply messages" as read for current user, in one statement
+                # Current user DID in this function is sender_did
+                try:
+                    await asyncio.to_thread(_mark_read, db_path, new_reply_ids, sender_did)
+                except Exception:
+                    # Error does not affect main flow
+                    pass
+                
                 # If all receivers have replied, return result
                 if len(replied_dids) == len(receiver_dids):
                     base_data["replies"] = replies
@@ -383,11 +375,16 @@ async def _send_message(
                         "data": base_data,
                         "database_path": str(db_path),
                     }
-            finally:
-                conn.close()
             
-            # Wait for a while before continuing polling
-            await asyncio.sleep(poll_interval)
+                # Wait until a new message lands in this group or the polling interval elapses
+                remaining = timeout - (time.time() - start_time)
+                try:
+                    await asyncio.wait_for(reply_event.wait(), timeout=max(0, min(poll_interval, remaining)))
+                except asyncio.TimeoutError:
+                    pass
+                reply_event.clear()
+        finally:
+            pool.unsubscribe(group_id, reply_event)
         
         # Timeout case
         base_data["replies"] = replies
@@ -0,0 +1,95 @@
+"""Coalescing writer for message_history inserts
+- Concurrent sends running on the same event loop enqueue their rows instead of each
+  committing on its own
+- A flusher task waits LINGER seconds, drains up to MAX_BATCH queued rows, inserts them with one
+  executemany and a single commit on the pooled read-write connection, then resolves every
+  waiting sender's future; fsync cost is paid per batch rather than per message
+- If a batch fails (e.g. a duplicate message_id), its rows are retried one by one so only the
+  offending send sees the error
+- The flusher exits once the queue is empty, so short-lived event loops (the visualization
+  interface runs each send in its own loop) never leave a pending task behind
+"""
+
+import asyncio
+import weakref
+
+from message import jsonutil, pool
+from message.db import insert_messages
+
+LINGER = 0.005
+MAX_BATCH = 256
+
+
+class _Coalescer:
+    """Per-(event loop, database) queue of pending inserts"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+
+    async def flush(self) -> None:
+        while not self.queue.empty():
+            await asyncio.sleep(LINGER)
+            batch = []
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            rows = [row for row, _ in batch]
+            try:
+                await asyncio.to_thread(_write_batch, self.db_path, rows)
+            except Exception:
+                # Fall back to one transaction per row so a single bad row does not fail the others
+                for row, future in batch:
+                    try:
+                        await asyncio.to_thread(_write_batch, self.db_path, [row])
+                    except Exception as e:
+                        _resolve(future, e)
+                    else:
+                        _resolve(future, None)
+            else:
+                for _, future in batch:
+                    _resolve(future, None)
+
+
+def _resolve(future: asyncio.Future, error: Exception | None) -> None:
+    if future.done():
+        # The sender stopped waiting (cancelled or timed out)
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+def _write_batch(db_path: str, rows: list) -> None:
+    """Insert rows and commit in one transaction, then wake waiters on the affected groups and receivers (blocking)"""
+    with pool.get_rw(db_path) as conn:
+        insert_messages(conn, rows)
+        conn.commit()
+    # row[4] is group_id and row[3] the receiver_dids JSON array; reply waiters subscribe to the group,
+    # check_new_messages subscribes to its own DID
+    keys = {row[4] for row in rows}
+    for row in rows:
+        keys.update(jsonutil.loads(row[3]))
+    pool.notify(*keys)
+
+
+_COALESCERS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, _Coalescer]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def insert_message(db_path, row: tuple) -> None:
+    """Queue one new message row (insert_messages() layout) and wait until it is committed"""
+    loop = asyncio.get_running_loop()
+    key = str(db_path)
+    coalescers = _COALESCERS.setdefault(loop, {})
+    coalescer = coalescers.get(key)
+    if coalescer is None:
+        coalescer = coalescers[key] = _Coalescer(key)
+
+    future = loop.create_future()
+    coalescer.queue.put_nowait((row, future))
+    if coalescer.task is None or coalescer.task.done():
+        coalescer.task = loop.create_task(coalescer.flush())
+    await future
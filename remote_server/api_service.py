@@ -4,18 +4,32 @@ AgentMessage Remote Database API Service
 
 This module provides a simple HTTP API for the remote database service,
 allowing external applications to interact with the AgentMessage database.
+Requests are served on one thread each (ThreadingHTTPServer), so slow database
+calls do not hold up other clients; database connections come from the
+thread-safe pool in RemoteDatabase.
 """
 
 import json
 import logging
+import os
+import socketserver
+import stat
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 
 from config import RemoteConfig
 from database import RemoteDatabase
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,34 +44,115 @@ class DateTimeEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super().default(obj)
 
-# Global database instance
+def _encode_json(data: Dict[str, Any]) -> bytes:
+    """Serialize a response body as compact JSON, writing datetimes as ISO 8601 strings
+    
+    Database results carry raw datetime values; orjson (when installed) encodes them in C
+    during its single pass over the payload, DateTimeEncoder does the same for json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, cls=DateTimeEncoder).encode('utf-8')
+
+# Serialized bodies of successful identity GET responses, keyed by request path:
+# path -> (payload, expiry), least recently used first. Entries expire after the TTL below and
+# are dropped as soon as the identity is created, updated or deleted through this server; writes
+# that reach PostgreSQL some other way only show up once the entry expires.
+IDENTITY_LIST_CACHE_TTL = 5.0
+IDENTITY_CACHE_TTL = 30.0
+_RESPONSE_CACHE_MAX = 10000  # least recently used entries are evicted beyond this
+_response_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+# Bumped by every invalidation; a response read from the database before a write committed must
+# not be stored after that write's invalidation
+_cache_generation = 0
+
+def _cache_get(key: str) -> Tuple[Optional[bytes], int]:
+    """Return (cached response body or None if missing/expired, cache generation).
+    
+    Pass the generation to _cache_put when storing the body built after a miss.
+    """
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+        if entry is None:
+            return None, _cache_generation
+        if entry[1] < time.monotonic():
+            del _response_cache[key]
+            return None, _cache_generation
+        _response_cache.move_to_end(key)
+        return entry[0], _cache_generation
+
+def _cache_put(key: str, payload: bytes, ttl: float, generation: int):
+    """Store a response body for ttl seconds, unless the cache was invalidated since generation."""
+    with _response_cache_lock:
+        if generation != _cache_generation:
+            return
+        _response_cache[key] = (payload, time.monotonic() + ttl)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > _RESPONSE_CACHE_MAX:
+            _response_cache.popitem(last=False)
+
+def _cache_invalidate(did: str):
+    """Drop the cached lists (every page) and the cached entry for did after a write."""
+    global _cache_generation
+    with _response_cache_lock:
+        _cache_generation += 1
+        for key in [k for k in _response_cache if k == '/identities' or k.startswith('/identities?')]:
+            del _response_cache[key]
+        _response_cache.pop(f'/identities/{did}', None)
+
+# Global database instance, created once and shared by all request threads
 _db_instance = None
+_db_instance_lock = threading.Lock()
 
 def get_database_instance():
     """Get or create the global database instance."""
     global _db_instance
-    if _db_instance is None:
+    if _db_instance is not None:
+        return _db_instance
+    with _db_instance_lock:
+        if _db_instance is not None:
+            return _db_instance
         config = RemoteConfig()
-        _db_instance = RemoteDatabase(config)
-        # Ensure tables are created
-        result = _db_instance.create_tables()
+        db = RemoteDatabase(config)
+        # Ensure tables are created before other threads can use the instance
+        result = db.create_tables()
         if result['status'] != 'success':
             logger.error(f"Failed to create database tables: {result.get('message', 'Unknown error')}")
         else:
             logger.info("Database tables created successfully")
+        _db_instance = db
     return _db_instance
 
 class DatabaseAPIHandler(BaseHTTPRequestHandler):
-    """HTTP request handler for database API endpoints."""
+    """HTTP request handler for database API endpoints.
     
-    def __init__(self, *args, **kwargs):
-        self.db = get_database_instance()
-        super().__init__(*args, **kwargs)
+    db is the shared RemoteDatabase, bound once by run_api_server() before serving.
+    Connections are kept alive (HTTP/1.1) so clients and the nginx upstream can send
+    further requests without reconnecting; every response carries Content-Length.
+    """
+    
+    db: RemoteDatabase = None
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = 60
+    
+    def parse_request(self) -> bool:
+        self._body_read = False
+        return super().parse_request()
     
     def _send_json_response(self, data: Dict[str, Any], status_code: int = 200):
         """Send JSON response with appropriate headers."""
+        self._send_payload(_encode_json(data), status_code)
+    
+    def _send_payload(self, payload: bytes, status_code: int = 200):
+        """Send an already serialized JSON body with appropriate headers."""
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
         # CORS headers are now handled by nginx, but keep for direct access
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
@@ -65,10 +160,12 @@ class DatabaseAPIHandler(BaseHTTPRequestHandler):
         # Add security headers (nginx also adds these, but redundancy is good)
         self.send_header('X-Content-Type-Options', 'nosniff')
         self.send_header('X-Frame-Options', 'DENY')
+        # A request body left unread would be parsed as the next request; close instead
+        if not self._body_read and self.headers.get('Content-Length', '0').strip() not in ('', '0'):
+            self.send_header('Connection', 'close')
+            self.close_connection = True
         self.end_headers()
-        
-        response_json = json.dumps(data, indent=2, cls=DateTimeEncoder)
-        self.wfile.write(response_json.encode('utf-8'))
+        self.wfile.write(payload)
     
     def _send_error_response(self, message: str, status_code: int = 400):
         """Send error response."""
@@ -85,8 +182,10 @@ class DatabaseAPIHandler(BaseHTTPRequestHandler):
             if content_length == 0:
                 return None
             
+            # Both parsers take the raw bytes, so the body is not decoded to str first
             body = self.rfile.read(content_length)
-            return json.loads(body.decode('utf-8'))
+            self._body_read = True
+            return orjson.loads(body) if orjson is not None else json.loads(body)
         except (ValueError, json.JSONDecodeError) as e:
             logger.error(f"Error parsing request body: {e}")
             return None
@@ -179,17 +278,60 @@ class DatabaseAPIHandler(BaseHTTPRequestHandler):
             self._send_error_response(f'Health check failed: {str(e)}', 503)
     
     def _handle_get_identities(self, query_params: Dict[str, list]):
-        """Handle GET /identities endpoint."""
-        try:           
-            result = self.db.get_identities()
+        """Handle GET /identities endpoint.
+        
+        Optional ?limit=N&offset=M query parameters page through the list, so clients
+        with many identities need not fetch them all in one response. For deep listings,
+        pass the previous page's next_cursor as ?after=... instead of an offset: the page
+        then starts right after that identity without skipping over the earlier rows.
+        ?capability=X only lists identities that have capability X.
+        """
+        try:
+            try:
+                limit = int(query_params['limit'][0]) if 'limit' in query_params else None
+                offset = int(query_params['offset'][0]) if 'offset' in query_params else 0
+            except ValueError:
+                self._send_error_response('limit and offset must be integers', 400)
+                return
+            if (limit is not None and limit < 1) or offset < 0:
+                self._send_error_response('limit must be positive and offset non-negative', 400)
+                return
+            
+            after = None
+            after_param = query_params['after'][0] if 'after' in query_params else ''
+            if after_param:
+                updated_at, sep, did = after_param.partition('|')
+                if not sep or not updated_at or not did:
+                    self._send_error_response('after must be a next_cursor value', 400)
+                    return
+                after = (updated_at, did)
+            
+            capability = query_params['capability'][0] if 'capability' in query_params else None
+            
+            if limit is None and offset == 0 and after is None and capability is None:
+                cache_key = '/identities'
+            else:
+                cache_key = (f'/identities?limit={limit}&offset={offset}&after={after_param}'
+                             f'&capability={capability}')
+            payload, generation = _cache_get(cache_key)
+            if payload is not None:
+                self._send_payload(payload)
+                return
+            
+            result = self.db.get_identities(limit=limit, offset=offset, after=after,
+                                            capability=capability)
             
             if result['status'] == 'success':
-                self._send_json_response({
+                next_cursor = result.get('next_cursor')
+                payload = _encode_json({
                     'success': True,
                     'identities': result['identities'],
                     'count': len(result['identities']),
-                    'total': result.get('total', 0)
+                    'total': result.get('total', 0),
+                    'next_cursor': '|'.join(next_cursor) if next_cursor else None
                 })
+                _cache_put(cache_key, payload, IDENTITY_LIST_CACHE_TTL, generation)
+                self._send_payload(payload)
             else:
                 self._send_error_response(result['message'], 500)
                 
@@ -199,13 +341,21 @@ class DatabaseAPIHandler(BaseHTTPRequestHandler):
     def _handle_get_identity(self, did: str):
         """Handle GET /identities/{did} endpoint."""
         try:
+            cache_key = f'/identities/{did}'
+            payload, generation = _cache_get(cache_key)
+            if payload is not None:
+                self._send_payload(payload)
+                return
+            
             result = self.db.get_identity_by_did(did)
             
             if result['status'] == 'success':
                 # Return the identity data directly (not nested under 'identity' key)
                 identity_data = result['identity']
                 identity_data['success'] = True
-                self._send_json_response(identity_data)
+                payload = _encode_json(identity_data)
+                _cache_put(cache_key, payload, IDENTITY_CACHE_TTL, generation)
+                self._send_payload(payload)
             elif result['status'] == 'not_found':
                 self._send_error_response('Identity not found', 404)
             else:
@@ -232,6 +382,7 @@ class DatabaseAPIHandler(BaseHTTPRequestHandler):
             result = self.db.insert_identity(body)
             
             if result['status'] == 'success':
+                _cache_invalidate(body['did'])
                 self._send_json_response({
                     'success': True,
                     'message': 'Identity created successfully',
@@ -257,6 +408,7 @@ class DatabaseAPIHandler(BaseHTTPRequestHandler):
             result = self.db.insert_identity(body)  # This will update if exists
             
             if result['status'] == 'success':
+                _cache_invalidate(did)
                 self._send_json_response({
                     'success': True,
                     'message': 'Identity updated successfully',
@@ -274,6 +426,7 @@ class DatabaseAPIHandler(BaseHTTPRequestHandler):
             result = self.db.delete_identity(did)
             
             if result['status'] == 'success':
+                _cache_invalidate(did)
                 self._send_json_response({
                     'success': True,
                     'message': 'Identity deleted successfully',
@@ -298,14 +451,37 @@ class DatabaseAPIHandler(BaseHTTPRequestHandler):
         else:
             logger.info(f"{real_ip} [{forwarded_proto}] - {format % args}")
 
-def run_api_server(host: str = '0.0.0.0', port: int = 8000):
-    """Run the API server."""
+class ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """ThreadingHTTPServer counterpart listening on a Unix domain socket (e.g. when nginx runs on the same host)."""
+    
+    daemon_threads = True
+    
+    def get_request(self):
+        request, _ = super().get_request()
+        # Unix socket peers have no address; give handlers the (host, port) shape they log
+        return request, ('unix', 0)
+
+def run_api_server(host: str = '0.0.0.0', port: int = 8000, unix_socket: Optional[str] = None):
+    """Run the API server.
+    
+    Listens on host:port over TCP, or on the Unix domain socket at unix_socket when given
+    (a stale socket file left by a previous run is replaced).
+    """
     try:
-        server = HTTPServer((host, port), DatabaseAPIHandler)
-        logger.info(f"Starting AgentMessage Database API server on {host}:{port}")
+        # Connect and create tables up front instead of on the first request
+        DatabaseAPIHandler.db = get_database_instance()
+        if unix_socket:
+            if os.path.exists(unix_socket) and stat.S_ISSOCK(os.stat(unix_socket).st_mode):
+                os.unlink(unix_socket)
+            server = ThreadingUnixHTTPServer(unix_socket, DatabaseAPIHandler)
+            logger.info(f"Starting AgentMessage Database API server on unix:{unix_socket}")
+        else:
+            server = ThreadingHTTPServer((host, port), DatabaseAPIHandler)
+            server.daemon_threads = True
+            logger.info(f"Starting AgentMessage Database API server on {host}:{port}")
         logger.info(f"Available endpoints:")
         logger.info(f"  GET  /health - Health check")
-        logger.info(f"  GET  /identities - List all identities")
+        logger.info(f"  GET  /identities - List identities (optional ?limit=N&offset=M or &after=<next_cursor>, &capability=X)")
         logger.info(f"  GET  /identities/{{did}} - Get specific identity")
         logger.info(f"  POST /identities - Create new identity")
         logger.info(f"  PUT  /identities/{{did}} - Update identity")
@@ -320,10 +496,9 @@ def run_api_server(host: str = '0.0.0.0', port: int = 8000):
         raise
 
 if __name__ == '__main__':
-    import os
-    
     # Get configuration from environment
     host = os.getenv('API_HOST', '0.0.0.0')
     port = int(os.getenv('API_PORT', '8000'))
+    unix_socket = os.getenv('API_UNIX_SOCKET') or None
     
-    run_api_server(host, port)
\ No newline at end of file
+    run_api_server(host, port, unix_socket)
\ No newline at end of file
@@ -4,8 +4,17 @@ import os
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
+# .env files already loaded into os.environ by this process; load_dotenv never overrides
+# variables that are already set, so loading the same file again would only re-read it
+_DOTENV_LOADED: set[str] = set()
+
 class RemoteConfig:
-    """Remote PostgreSQL database configuration manager"""
+    """Remote PostgreSQL database configuration manager
+    
+    Environment variables are read and parsed once, when the instance is created; the getters
+    return the cached values (treat the returned dicts as read-only). Call reload() to pick up
+    changed variables.
+    """
     
     def __init__(self, env_file: str = '.env'):
         """Initialize configuration manager
@@ -14,15 +23,14 @@ class RemoteConfig:
             env_file: Path to environment file
         """
         self.env_file = env_file
-        load_dotenv(env_file)
+        if env_file not in _DOTENV_LOADED:
+            load_dotenv(env_file)
+            _DOTENV_LOADED.add(env_file)
+        self.reload()
     
-    def get_database_config(self) -> Dict[str, Any]:
-        """Get database connection configuration
-        
-        Returns:
-            Dictionary containing database configuration
-        """
-        return {
+    def reload(self):
+        """Re-read the configuration from the environment"""
+        self._db_config = {
             'host': os.getenv('REMOTE_DB_HOST', 'localhost'),
             'port': int(os.getenv('REMOTE_DB_PORT', '5432')),
             'database': os.getenv('REMOTE_DB_NAME', 'agentmessage'),
@@ -32,6 +40,48 @@ class RemoteConfig:
             'connect_timeout': int(os.getenv('REMOTE_DB_CONNECTION_TIMEOUT', '30')),
             'application_name': 'AgentMessage'
         }
+        # REMOTE_DB_HOST/PORT point at a pgbouncer in transaction pooling mode; it multiplexes
+        # clients onto a few PostgreSQL backends, so a small client-side pool is enough
+        self._via_pgbouncer = os.getenv('REMOTE_DB_VIA_PGBOUNCER', 'false').lower() == 'true'
+        server_max = os.getenv('REMOTE_DB_MAX_SERVER_CONNECTIONS')
+        self._pool_config = {
+            'minconn': int(os.getenv('REMOTE_DB_MIN_CONNECTIONS', '1' if self._via_pgbouncer else '5')),
+            'maxconn': int(os.getenv('REMOTE_DB_MAX_CONNECTIONS', '5' if self._via_pgbouncer else '25')),
+            # PostgreSQL's max_connections, if known; None -> queried from the server at startup
+            'server_max_connections': int(server_max) if server_max else None
+        }
+        self._discoverable = os.getenv('REMOTE_DISCOVERABLE', 'false').lower() == 'true'
+        self._unlogged_tables = os.getenv('REMOTE_DB_UNLOGGED', 'false').lower() == 'true'
+        
+        required_fields = ['host', 'database', 'user', 'password']
+        missing_fields = [
+            f'REMOTE_DB_{field.upper()}' for field in required_fields if not self._db_config.get(field)
+        ]
+        self._validation = {
+            'valid': len(missing_fields) == 0,
+            'missing_fields': missing_fields,
+            'config': self._db_config
+        }
+        
+        config = self._db_config
+        self._connection_string = (
+            f"host={config['host']} "
+            f"port={config['port']} "
+            f"dbname={config['database']} "
+            f"user={config['user']} "
+            f"password={config['password']} "
+            f"sslmode={config['sslmode']} "
+            f"connect_timeout={config['connect_timeout']} "
+            f"application_name={config['application_name']}"
+        ) if self._validation['valid'] else None
+    
+    def get_database_config(self) -> Dict[str, Any]:
+        """Get database connection configuration
+        
+        Returns:
+            Dictionary containing database configuration
+        """
+        return self._db_config
     
     def get_connection_pool_config(self) -> Dict[str, Any]:
         """Get connection pool configuration
@@ -39,10 +89,7 @@ class RemoteConfig:
         Returns:
             Dictionary containing connection pool settings
         """
-        return {
-            'minconn': int(os.getenv('REMOTE_DB_MIN_CONNECTIONS', '5')),
-            'maxconn': int(os.getenv('REMOTE_DB_MAX_CONNECTIONS', '20'))
-        }
+        return self._pool_config
     
     def is_remote_discoverable(self) -> bool:
         """Check if remote discovery is enabled
@@ -50,7 +97,23 @@ class RemoteConfig:
         Returns:
             True if remote discovery is enabled
         """
-        return os.getenv('REMOTE_DISCOVERABLE', 'false').lower() == 'true'
+        return self._discoverable
+    
+    def is_via_pgbouncer(self) -> bool:
+        """Check if connections go through pgbouncer (transaction pooling)
+        
+        Returns:
+            True if REMOTE_DB_VIA_PGBOUNCER is enabled
+        """
+        return self._via_pgbouncer
+    
+    def use_unlogged_tables(self) -> bool:
+        """Check if tables should be created UNLOGGED (test/dev databases only)
+        
+        Returns:
+            True if REMOTE_DB_UNLOGGED is enabled
+        """
+        return self._unlogged_tables
     
     def validate_config(self) -> Dict[str, Any]:
         """Validate database configuration
@@ -58,19 +121,7 @@ class RemoteConfig:
         Returns:
             Dictionary with validation status and missing fields
         """
-        config = self.get_database_config()
-        required_fields = ['host', 'database', 'user', 'password']
-        missing_fields = []
-        
-        for field in required_fields:
-            if not config.get(field):
-                missing_fields.append(f'REMOTE_DB_{field.upper()}')
-        
-        return {
-            'valid': len(missing_fields) == 0,
-            'missing_fields': missing_fields,
-            'config': config
-        }
+        return self._validation
     
     def get_connection_string(self) -> Optional[str]:
         """Get PostgreSQL connection string
@@ -78,18 +129,4 @@ class RemoteConfig:
         Returns:
             Connection string or None if configuration is invalid
         """
-        validation = self.validate_config()
-        if not validation['valid']:
-            return None
-        
-        config = validation['config']
-        return (
-            f"host={config['host']} "
-            f"port={config['port']} "
-            f"dbname={config['database']} "
-            f"user={config['user']} "
-            f"password={config['password']} "
-            f"sslmode={config['sslmode']} "
-            f"connect_timeout={config['connect_timeout']} "
-            f"application_name={config['application_name']}"
-        )
\ No newline at end of file
+        return self._connection_string
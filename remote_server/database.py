@@ -1,27 +1,116 @@
 """Remote PostgreSQL database operations"""
 
+import csv
+import io
 import json
 import logging
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+import threading
+import weakref
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from contextlib import contextmanager
 import psycopg2
 from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import Json, execute_values
 from config import RemoteConfig
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def convert_datetime_to_string(obj):
-    """Convert datetime objects to ISO format strings recursively."""
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    elif isinstance(obj, dict):
-        return {key: convert_datetime_to_string(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_datetime_to_string(item) for item in obj]
-    return obj
+# Per-identity CRUD queries: name -> (parameter types, SQL with %s placeholders). Each is
+# prepared server-side once per pooled connection so repeat calls skip PostgreSQL's parse and
+# plan steps; behind pgbouncer (transaction pooling) the plain SQL is sent instead
+_UPSERT_IDENTITY_SQL = """
+        INSERT INTO identities 
+        (did, name, description, capabilities, updated_at)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (did) DO UPDATE SET
+            name = EXCLUDED.name,
+            description = EXCLUDED.description,
+            capabilities = EXCLUDED.capabilities,
+            updated_at = CURRENT_TIMESTAMP
+"""
+
+_IDENTITY_STATEMENTS = {
+    'upsert_identity': (('text', 'text', 'text', 'jsonb'), _UPSERT_IDENTITY_SQL),
+    'upsert_identity_returning': (('text', 'text', 'text', 'jsonb'),
+                                  _UPSERT_IDENTITY_SQL + "RETURNING did, created_at, updated_at"),
+    'get_identity': (('text',), """
+        SELECT did, name, description, capabilities, 
+               created_at, updated_at
+        FROM identities 
+        WHERE did = %s
+    """),
+    'delete_identity': (('text',), """
+        DELETE FROM identities WHERE did = %s
+    """),
+}
+
+_PREPARED_STATEMENTS = {
+    name: f"PREPARE {name} ({', '.join(types)}) AS "
+          + sql % tuple(f'${i}' for i in range(1, len(types) + 1))
+    for name, (types, sql) in _IDENTITY_STATEMENTS.items()
+}
+
+_EXECUTE_STATEMENTS = {
+    name: f"EXECUTE {name} ({', '.join(['%s'] * len(types))})"
+    for name, (types, sql) in _IDENTITY_STATEMENTS.items()
+}
+
+# Trigger function mirroring identities.capabilities (a JSON array of strings) into
+# identity_capabilities; JSON nulls in the array are skipped, and an update that leaves
+# capabilities unchanged does no work
+_SYNC_CAPABILITIES_FUNCTION_SQL = """
+    CREATE OR REPLACE FUNCTION sync_identity_capabilities()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            IF NEW.capabilities IS NOT DISTINCT FROM OLD.capabilities THEN
+                RETURN NEW;
+            END IF;
+            DELETE FROM identity_capabilities WHERE did = NEW.did;
+        END IF;
+        IF jsonb_typeof(NEW.capabilities) = 'array' THEN
+            INSERT INTO identity_capabilities (did, capability)
+            SELECT NEW.did, c.value
+            FROM jsonb_array_elements_text(NEW.capabilities) AS c(value)
+            WHERE c.value IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+# Pooled connections on which _PREPARED_STATEMENTS have been prepared
+_prepared_connections: "weakref.WeakSet" = weakref.WeakSet()
+
+def _ensure_prepared(conn):
+    """Prepare _PREPARED_STATEMENTS on conn unless already done for this connection"""
+    if conn in _prepared_connections:
+        return
+    with conn.cursor() as cursor:
+        for statement in _PREPARED_STATEMENTS.values():
+            cursor.execute(statement)
+    _prepared_connections.add(conn)
+
+# Column order of the identity SELECTs; zip() pairs a row tuple with these names (and
+# ignores any trailing extra column, such as the list query's window total)
+_IDENTITY_KEYS = ('did', 'name', 'description', 'capabilities', 'created_at', 'updated_at')
+
+def _identity_from_row(row: Tuple) -> Dict[str, Any]:
+    """Build an identity dict from an identities row tuple
+    
+    psycopg2 already decodes the JSONB capabilities column; only text values (e.g. from
+    a database where the column is not JSONB) are parsed here. Timestamps stay datetime
+    objects; the API layer encodes them as ISO 8601 when it serializes the response.
+    """
+    identity = dict(zip(_IDENTITY_KEYS, row))
+    if isinstance(identity['capabilities'], str):
+        identity['capabilities'] = json.loads(identity['capabilities'])
+    return identity
+
+# Rows fetched per round trip when get_identities streams a large listing
+STREAM_BATCH_SIZE = 500
 
 class RemoteDatabase:
     """Remote PostgreSQL database manager"""
@@ -33,7 +122,13 @@ class RemoteDatabase:
             config: Remote configuration instance
         """
         self.config = config or RemoteConfig()
+        # pgbouncer's transaction pooling hands each transaction to any server connection, so
+        # session-level PREPAREd statements cannot be relied on there
+        self._use_prepared = not self.config.is_via_pgbouncer()
         self._connection_pool = None
+        # Bounds concurrent borrowers to the pool size: ThreadedConnectionPool raises instead of
+        # waiting when it is exhausted, so extra request threads queue here
+        self._connection_slots = None
         self._initialize_pool()
     
     def _initialize_pool(self):
@@ -52,10 +147,52 @@ class RemoteDatabase:
                 pool_config['maxconn'],
                 connection_string
             )
+            self._connection_slots = threading.BoundedSemaphore(pool_config['maxconn'])
             logger.info("Database connection pool initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize connection pool: {e}")
             self._connection_pool = None
+            return
+        
+        if self.config.is_via_pgbouncer():
+            # maxconn counts client connections to pgbouncer, not PostgreSQL backends
+            logger.info("Connecting through pgbouncer; server-side prepared statements disabled")
+            return
+        self._check_pool_size(pool_config)
+    
+    def _statement(self, conn, name: str) -> str:
+        """Return the SQL to run for one of _IDENTITY_STATEMENTS on conn
+        
+        EXECUTE of the per-connection prepared statement, or the plain query behind pgbouncer.
+        """
+        if not self._use_prepared:
+            return _IDENTITY_STATEMENTS[name][1]
+        _ensure_prepared(conn)
+        return _EXECUTE_STATEMENTS[name]
+    
+    def _check_pool_size(self, pool_config: Dict[str, Any]):
+        """Warn when maxconn leaves little headroom below the server's max_connections
+        
+        Other clients (psql, pgAdmin, more API replicas) share the same server limit, so a pool
+        above 80% of it risks connection refusals under load.
+        """
+        server_max = pool_config.get('server_max_connections')
+        try:
+            if server_max is None:
+                with self.get_connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SHOW max_connections")
+                        server_max = int(cursor.fetchone()[0])
+                    conn.rollback()
+        except Exception as e:
+            logger.warning(f"Could not read max_connections from the server: {e}")
+            return
+        
+        if pool_config['maxconn'] > 0.8 * server_max:
+            logger.warning(
+                f"REMOTE_DB_MAX_CONNECTIONS={pool_config['maxconn']} is above 80% of the server's "
+                f"max_connections={server_max}; lower it or raise max_connections"
+            )
     
     @contextmanager
     def get_connection(self):
@@ -68,16 +205,17 @@ class RemoteDatabase:
             raise Exception("Database connection pool not initialized")
         
         conn = None
-        try:
-            conn = self._connection_pool.getconn()
-            yield conn
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if conn:
-                self._connection_pool.putconn(conn)
+        with self._connection_slots:
+            try:
+                conn = self._connection_pool.getconn()
+                yield conn
+            except Exception as e:
+                if conn:
+                    conn.rollback()
+                raise e
+            finally:
+                if conn:
+                    self._connection_pool.putconn(conn)
     
     def create_tables(self) -> Dict[str, Any]:
         """Create necessary database tables
@@ -89,9 +227,15 @@ class RemoteDatabase:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Create identities table
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS identities (
+                # Several API processes (or a health check racing startup) may run this at once;
+                # concurrent CREATE ... IF NOT EXISTS can still collide, so take turns
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('agentmessage.create_tables'))")
+                
+                # Create identities table; UNLOGGED (REMOTE_DB_UNLOGGED) skips WAL for
+                # write-heavy test/dev databases, at the cost of being emptied after a crash
+                table_kind = "UNLOGGED TABLE" if self.config.use_unlogged_tables() else "TABLE"
+                cursor.execute(f"""
+                    CREATE {table_kind} IF NOT EXISTS identities (
                         did TEXT PRIMARY KEY,
                         name TEXT NOT NULL,
                         description TEXT NOT NULL,
@@ -112,11 +256,56 @@ class RemoteDatabase:
                     ON identities(created_at)
                 """)
                 
+                # Serves the list order and keyset pages (updated_at, did) < cursor
                 cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_identities_capabilities 
-                    ON identities USING GIN(capabilities)
+                    CREATE INDEX IF NOT EXISTS idx_identities_updated_did 
+                    ON identities(updated_at DESC, did DESC)
                 """)
                 
+                # Capabilities normalized one per row for equality lookups, kept in sync by a
+                # trigger so writers that bypass this class (identity/tools.py) stay covered.
+                # Its btree indexes replace the GIN index on identities.capabilities, which
+                # cost more to maintain on every write. Set up (and backfilled) only once:
+                # health checks call create_tables too
+                cursor.execute("""
+                    SELECT to_regclass('identity_capabilities') IS NULL, relpersistence = 'u'
+                    FROM pg_class WHERE oid = 'identities'::regclass
+                """)
+                missing, identities_unlogged = cursor.fetchone()
+                if missing:
+                    # Same persistence as identities: a logged table cannot reference an
+                    # unlogged one, whatever REMOTE_DB_UNLOGGED says now
+                    table_kind = "UNLOGGED TABLE" if identities_unlogged else "TABLE"
+                    cursor.execute(f"""
+                        CREATE {table_kind} IF NOT EXISTS identity_capabilities (
+                            did TEXT NOT NULL REFERENCES identities(did)
+                                ON DELETE CASCADE ON UPDATE CASCADE,
+                            capability TEXT NOT NULL,
+                            PRIMARY KEY (did, capability)
+                        )
+                    """)
+                    cursor.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_identity_capabilities_capability 
+                        ON identity_capabilities(capability, did)
+                    """)
+                    cursor.execute(_SYNC_CAPABILITIES_FUNCTION_SQL)
+                    cursor.execute("""
+                        DROP TRIGGER IF EXISTS sync_identity_capabilities ON identities;
+                        CREATE TRIGGER sync_identity_capabilities
+                            AFTER INSERT OR UPDATE OF capabilities ON identities
+                            FOR EACH ROW
+                            EXECUTE FUNCTION sync_identity_capabilities()
+                    """)
+                    cursor.execute("""
+                        INSERT INTO identity_capabilities (did, capability)
+                        SELECT i.did, c.value
+                        FROM identities i,
+                             jsonb_array_elements_text(i.capabilities) AS c(value)
+                        WHERE jsonb_typeof(i.capabilities) = 'array' AND c.value IS NOT NULL
+                        ON CONFLICT DO NOTHING
+                    """)
+                    cursor.execute("DROP INDEX IF EXISTS idx_identities_capabilities")
+                
                 conn.commit()
                 
                 return {
@@ -131,11 +320,13 @@ class RemoteDatabase:
                 'message': f'Failed to create tables: {str(e)}'
             }
     
-    def insert_identity(self, identity_data: Dict[str, Any]) -> Dict[str, Any]:
+    def insert_identity(self, identity_data: Dict[str, Any], return_row: bool = False) -> Dict[str, Any]:
         """Insert or update agent identity
         
         Args:
             identity_data: Identity information
+            return_row: Also return the stored did, created_at and updated_at (RETURNING);
+                off by default so plain writes skip the extra row round trip
             
         Returns:
             Operation result
@@ -144,30 +335,26 @@ class RemoteDatabase:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Convert capabilities to JSON if it's a list
+                # psycopg2's Json adapter serializes the capabilities; text is passed as is
                 capabilities = identity_data['capabilities']
-                if isinstance(capabilities, list):
-                    capabilities_json = json.dumps(capabilities, ensure_ascii=False)
-                else:
-                    capabilities_json = capabilities
+                capabilities_json = capabilities if isinstance(capabilities, str) else Json(capabilities)
                 
-                cursor.execute("""
-                    INSERT INTO identities 
-                    (did, name, description, capabilities, updated_at)
-                    VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
-                    ON CONFLICT (did) DO UPDATE SET
-                        name = EXCLUDED.name,
-                        description = EXCLUDED.description,
-                        capabilities = EXCLUDED.capabilities,
-                        updated_at = CURRENT_TIMESTAMP
-                    RETURNING did, created_at, updated_at
-                """, (
+                statement = 'upsert_identity_returning' if return_row else 'upsert_identity'
+                cursor.execute(self._statement(conn, statement), (
                     identity_data['did'],
                     identity_data['name'],
                     identity_data['description'],
                     capabilities_json
                 ))
                 
+                if not return_row:
+                    conn.commit()
+                    return {
+                        'status': 'success',
+                        'message': 'Identity inserted/updated successfully',
+                        'did': identity_data['did']
+                    }
+                
                 result = cursor.fetchone()
                 conn.commit()
                 
@@ -186,29 +373,177 @@ class RemoteDatabase:
                 'message': f'Failed to insert identity: {str(e)}'
             }
     
-    def get_identities(self, limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
-        """Retrieve agent identities
+    def bulk_insert_identities(self, identities: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Insert or update many agent identities in one transaction
+        
+        Rows are sent as multi-row INSERT ... ON CONFLICT statements (execute_values, 500 rows
+        per statement) with a single commit. When a DID appears more than once, the last entry wins.
+        
+        Args:
+            identities: Identity dicts with did, name, description and capabilities
+            
+        Returns:
+            Operation result with the number of identities written
+        """
+        try:
+            rows_by_did = {}
+            for identity_data in identities:
+                capabilities = identity_data['capabilities']
+                if not isinstance(capabilities, str):
+                    capabilities = Json(capabilities)
+                rows_by_did[identity_data['did']] = (
+                    identity_data['did'],
+                    identity_data['name'],
+                    identity_data['description'],
+                    capabilities
+                )
+            rows = list(rows_by_did.values())
+            if not rows:
+                return {
+                    'status': 'success',
+                    'message': 'No identities to insert',
+                    'count': 0
+                }
+            
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                execute_values(cursor, """
+                    INSERT INTO identities 
+                    (did, name, description, capabilities, updated_at)
+                    VALUES %s
+                    ON CONFLICT (did) DO UPDATE SET
+                        name = EXCLUDED.name,
+                        description = EXCLUDED.description,
+                        capabilities = EXCLUDED.capabilities,
+                        updated_at = CURRENT_TIMESTAMP
+                """, rows, template="(%s, %s, %s, %s, CURRENT_TIMESTAMP)", page_size=500)
+                conn.commit()
+                
+                return {
+                    'status': 'success',
+                    'message': f'{len(rows)} identities inserted/updated successfully',
+                    'count': len(rows)
+                }
+                
+        except Exception as e:
+            logger.error(f"Failed to bulk insert identities: {e}")
+            return {
+                'status': 'error',
+                'message': f'Failed to bulk insert identities: {str(e)}'
+            }
+    
+    def copy_identities(self, identities: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Load new agent identities with COPY ... FROM STDIN in one streamed command
+        
+        Meant for seeding test and benchmark databases. COPY cannot upsert: a DID that already
+        exists fails the whole load (nothing is written), so use bulk_insert_identities for
+        data that may overlap.
+        
+        Args:
+            identities: Identity dicts with did, name, description and capabilities
+            
+        Returns:
+            Operation result with the number of identities loaded
+        """
+        try:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator='\n')
+            count = 0
+            for identity_data in identities:
+                capabilities = identity_data['capabilities']
+                if not isinstance(capabilities, str):
+                    capabilities = json.dumps(capabilities, ensure_ascii=False)
+                writer.writerow((
+                    identity_data['did'],
+                    identity_data['name'],
+                    identity_data['description'],
+                    capabilities
+                ))
+                count += 1
+            if not count:
+                return {
+                    'status': 'success',
+                    'message': 'No identities to load',
+                    'count': 0
+                }
+            buffer.seek(0)
+            
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.copy_expert(
+                    # FORCE_NOT_NULL keeps empty names/descriptions as '' rather than NULL
+                    "COPY identities (did, name, description, capabilities) FROM STDIN "
+                    "WITH (FORMAT csv, FORCE_NOT_NULL (name, description))",
+                    buffer
+                )
+                conn.commit()
+                
+                return {
+                    'status': 'success',
+                    'message': f'{count} identities loaded successfully',
+                    'count': count
+                }
+                
+        except Exception as e:
+            logger.error(f"Failed to copy identities: {e}")
+            return {
+                'status': 'error',
+                'message': f'Failed to copy identities: {str(e)}'
+            }
+    
+    def get_identities(self, limit: Optional[int] = None, offset: int = 0,
+                       after: Optional[Tuple[str, str]] = None,
+                       capability: Optional[str] = None) -> Dict[str, Any]:
+        """Retrieve agent identities, most recently updated first
         
         Args:
             limit: Maximum number of records to return
             offset: Number of records to skip
+            after: (updated_at, did) of the last identity of the previous page; the page then
+                starts right after it using the (updated_at, did) index, however deep it is
+            capability: Only return identities listing this capability (exact match, looked
+                up in identity_capabilities)
             
         Returns:
-            List of identities
+            List of identities, plus next_cursor ((updated_at, did) to pass as after) when a
+            limited page came back full
         """
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                # Large or unbounded listings go through a server-side (named) cursor that
+                # transfers STREAM_BATCH_SIZE rows per round trip, so the client never holds the
+                # raw result set in addition to the dicts built below
+                streaming = limit is None or limit > STREAM_BATCH_SIZE
+                if streaming:
+                    cursor = conn.cursor(name='identities_list')
+                    cursor.itersize = STREAM_BATCH_SIZE
+                else:
+                    cursor = conn.cursor()
                 
                 # Build query
+                # On small offset pages COUNT(*) OVER () returns the total alongside each row, so
+                # the total does not take a second query. The window makes PostgreSQL read the
+                # whole filtered set before LIMIT applies, so keyset pages (whose window would
+                # only count the rows after the cursor anyway) and streamed listings leave it out
+                windowed = after is None and not streaming
                 query = """
                     SELECT did, name, description, capabilities, 
-                           created_at, updated_at
+                           created_at, updated_at{}
                     FROM identities 
-                    ORDER BY updated_at DESC
-                """
+                """.format(", COUNT(*) OVER () AS total" if windowed else "")
                 
+                filters = []
                 params = []
+                if capability is not None:
+                    filters.append("did IN (SELECT did FROM identity_capabilities WHERE capability = %s)")
+                    params.append(capability)
+                if after is not None:
+                    filters.append("(updated_at, did) < (%s, %s)")
+                    params.extend(after)
+                if filters:
+                    query += " WHERE " + " AND ".join(filters)
+                
+                query += " ORDER BY updated_at DESC, did DESC"
                 if limit:
                     query += " LIMIT %s"
                     params.append(limit)
@@ -218,37 +553,47 @@ class RemoteDatabase:
                     params.append(offset)
                 
                 cursor.execute(query, params)
-                identities = cursor.fetchall()
                 
-                # Convert to list of dictionaries and parse JSON capabilities
+                # Build the result dicts straight from the row tuples (one copy per identity)
                 result_identities = []
-                for identity in identities:
-                    identity_dict = dict(identity)
-                    # Parse capabilities JSON
-                    if isinstance(identity_dict['capabilities'], str):
-                        identity_dict['capabilities'] = json.loads(identity_dict['capabilities'])
-                    # Convert datetime objects to strings
-                    identity_dict = convert_datetime_to_string(identity_dict)
-                    result_identities.append(identity_dict)
-                
-                # Get total count using a regular cursor (not RealDictCursor)
-                count_cursor = conn.cursor()
-                count_cursor.execute("SELECT COUNT(*) FROM identities")
-                total_count = count_cursor.fetchone()[0]
+                row = None
+                for row in cursor:
+                    result_identities.append(_identity_from_row(row))
+                cursor.close()
+                
+                returned = len(result_identities)
+                if windowed and row is not None:
+                    total_count = row[6]
+                elif after is None and (limit is None or returned < limit) and (returned or offset == 0):
+                    # The listing ran to the end of the filtered set, so its size is known
+                    total_count = offset + returned
+                else:
+                    # Keyset pages, full streamed pages and offset pages past the end
+                    count_cursor = conn.cursor()
+                    if capability is not None:
+                        count_cursor.execute(
+                            "SELECT COUNT(*) FROM identity_capabilities WHERE capability = %s",
+                            (capability,)
+                        )
+                    else:
+                        count_cursor.execute("SELECT COUNT(*) FROM identities")
+                    total_count = count_cursor.fetchone()[0]
+                
+                next_cursor = None
+                if limit and len(result_identities) == limit and result_identities[-1]['updated_at']:
+                    last = result_identities[-1]
+                    next_cursor = (last['updated_at'].isoformat(), last['did'])
                 
                 return {
                     'status': 'success',
                     'total': total_count,
                     'count': len(result_identities),
-                    'identities': result_identities
+                    'identities': result_identities,
+                    'next_cursor': next_cursor
                 }
                 
         except Exception as e:
-            logger.error(f"Failed to get identities: {e}")
-            logger.error(f"Exception type: {type(e).__name__}")
-            logger.error(f"Exception args: {e.args}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Failed to get identities: {e}")
             return {
                 'status': 'error',
                 'message': f'Failed to get identities: {str(e)}',
@@ -268,24 +613,14 @@ class RemoteDatabase:
         """
         try:
             with self.get_connection() as conn:
-                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT did, name, description, capabilities, 
-                           created_at, updated_at
-                    FROM identities 
-                    WHERE did = %s
-                """, (did,))
+                cursor.execute(self._statement(conn, 'get_identity'), (did,))
                 
                 identity = cursor.fetchone()
                 
                 if identity:
-                    identity_dict = dict(identity)
-                    # Parse capabilities JSON
-                    if isinstance(identity_dict['capabilities'], str):
-                        identity_dict['capabilities'] = json.loads(identity_dict['capabilities'])
-                    # Convert datetime objects to strings
-                    identity_dict = convert_datetime_to_string(identity_dict)
+                    identity_dict = _identity_from_row(identity)
                     
                     return {
                         'status': 'success',
@@ -317,7 +652,7 @@ class RemoteDatabase:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("DELETE FROM identities WHERE did = %s", (did,))
+                cursor.execute(self._statement(conn, 'delete_identity'), (did,))
                 deleted_count = cursor.rowcount
                 conn.commit()
                 
@@ -24,8 +24,16 @@ ON identities(created_at);
 CREATE INDEX IF NOT EXISTS idx_identities_updated_at 
 ON identities(updated_at);
 
-CREATE INDEX IF NOT EXISTS idx_identities_capabilities 
-ON identities USING GIN(capabilities);
+-- Capabilities normalized one per row for equality lookups (replaces a GIN index on
+-- identities.capabilities), kept in sync with identities by the trigger below
+CREATE TABLE IF NOT EXISTS identity_capabilities (
+    did TEXT NOT NULL REFERENCES identities(did) ON DELETE CASCADE ON UPDATE CASCADE,
+    capability TEXT NOT NULL,
+    PRIMARY KEY (did, capability)
+);
+
+CREATE INDEX IF NOT EXISTS idx_identity_capabilities_capability 
+ON identity_capabilities(capability, did);
 
 -- Create a function to automatically update the updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -43,6 +51,34 @@ CREATE TRIGGER update_identities_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Mirror identities.capabilities (a JSON array of strings) into identity_capabilities,
+-- skipping JSON nulls
+CREATE OR REPLACE FUNCTION sync_identity_capabilities()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        IF NEW.capabilities IS NOT DISTINCT FROM OLD.capabilities THEN
+            RETURN NEW;
+        END IF;
+        DELETE FROM identity_capabilities WHERE did = NEW.did;
+    END IF;
+    IF jsonb_typeof(NEW.capabilities) = 'array' THEN
+        INSERT INTO identity_capabilities (did, capability)
+        SELECT NEW.did, c.value
+        FROM jsonb_array_elements_text(NEW.capabilities) AS c(value)
+        WHERE c.value IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sync_identity_capabilities ON identities;
+CREATE TRIGGER sync_identity_capabilities
+    AFTER INSERT OR UPDATE OF capabilities ON identities
+    FOR EACH ROW
+    EXECUTE FUNCTION sync_identity_capabilities();
+
 -- Create messages table for future message functionality
 CREATE TABLE IF NOT EXISTS messages (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
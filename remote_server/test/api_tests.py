@@ -8,9 +8,12 @@ It tests all endpoints, error handling, and data validation.
 
 import requests
 import json
+import os
 import time
 import sys
-from typing import Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
 from datetime import datetime
 from urllib3.exceptions import InsecureRequestWarning
 
@@ -18,13 +21,22 @@ from urllib3.exceptions import InsecureRequestWarning
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
 class AgentMessageAPITester:
+    # Supported methods, checked once instead of branching per request
+    METHODS = frozenset({'GET', 'POST', 'PUT', 'DELETE'})
+    
     def __init__(self, base_url: str = "https://battalions.cloud:8443", verify_ssl: bool = False):
         self.base_url = base_url.rstrip('/')
         self.verify_ssl = verify_ssl
-        self.session = requests.Session()
-        self.session.verify = verify_ssl
+        self.session = self._new_session()
+        # Per-worker sessions installed by run_concurrently (requests.Session is not thread-safe)
+        self._local = threading.local()
         self.test_results = []
         self.test_dids = []
+        # DIDs loaded straight into PostgreSQL by seed_identities, and the database used for it
+        self.seeded_dids = []
+        self.seed_db = None
+        # Serializes result lines from tests running concurrently
+        self._log_lock = threading.Lock()
         
     def log_test(self, test_name: str, success: bool, details: str = ""):
         """Log test result"""
@@ -33,25 +45,53 @@ class AgentMessageAPITester:
         result = f"[{timestamp}] {status} - {test_name}"
         if details:
             result += f" | {details}"
-        print(result)
-        self.test_results.append((test_name, success, details))
+        with self._log_lock:
+            print(result)
+            self.test_results.append((test_name, success, details))
+        
+    def print_header(self, title: str):
+        """Print a section header without interleaving it with concurrent output"""
+        with self._log_lock:
+            print(f"\n=== {title} ===")
+        
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        session.verify = self.verify_ssl
+        return session
+        
+    def _current_session(self) -> requests.Session:
+        """Session for the calling thread: its own inside run_concurrently, else the shared one"""
+        return getattr(self._local, 'session', self.session)
+        
+    def run_concurrently(self, *tests: Callable[[], Any]) -> List[Any]:
+        """Run independent tests at the same time and return their results in order
+        
+        Each test gets its own session, and so its own keep-alive connection, for as long
+        as it runs; wall-clock time is that of the slowest test.
+        """
+        def run(test: Callable[[], Any]) -> Any:
+            self._local.session = self._new_session()
+            try:
+                return test()
+            finally:
+                self._local.session.close()
+                del self._local.session
+        
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            futures = [executor.submit(run, test) for test in tests]
+            return [future.result() for future in futures]
         
     def make_request(self, method: str, endpoint: str, data: Optional[Dict] = None, 
                     expected_status: int = 200) -> tuple[bool, Dict[str, Any], int]:
         """Make API request and return success, response data, status code"""
-        url = f"{self.base_url}{endpoint}"
+        method = method.upper()
+        if method not in self.METHODS:
+            return False, {"error": f"Unsupported method: {method}"}, 0
         
         try:
-            if method.upper() == 'GET':
-                response = self.session.get(url)
-            elif method.upper() == 'POST':
-                response = self.session.post(url, json=data)
-            elif method.upper() == 'PUT':
-                response = self.session.put(url, json=data)
-            elif method.upper() == 'DELETE':
-                response = self.session.delete(url)
-            else:
-                return False, {"error": f"Unsupported method: {method}"}, 0
+            # Sessions are long-lived: their pooled keep-alive connection is reused, so the
+            # TLS handshake happens once per session rather than per request
+            response = self._current_session().request(method, self.base_url + endpoint, json=data)
                 
             try:
                 response_data = response.json()
@@ -66,7 +106,7 @@ class AgentMessageAPITester:
     
     def test_health_check(self):
         """Test health check endpoint"""
-        print("\n=== Health Check Test ===")
+        self.print_header("Health Check Test")
         success, data, status = self.make_request('GET', '/health', expected_status=200)
         
         if success and data.get('status') == 'healthy':
@@ -76,7 +116,7 @@ class AgentMessageAPITester:
             
     def test_list_empty_identities(self):
         """Test listing identities when database is empty"""
-        print("\n=== List Empty Identities Test ===")
+        self.print_header("List Empty Identities Test")
         success, data, status = self.make_request('GET', '/identities', expected_status=200)
         
         if success and isinstance(data.get('identities'), list):
@@ -155,7 +195,7 @@ class AgentMessageAPITester:
             
     def test_list_identities_with_pagination(self):
         """Test listing identities with pagination"""
-        print("\n=== Pagination Tests ===")
+        self.print_header("Pagination Tests")
         
         # Test with limit
         success, data, status = self.make_request('GET', '/identities?limit=1', expected_status=200)
@@ -176,13 +216,13 @@ class AgentMessageAPITester:
             
     def test_error_handling(self):
         """Test various error conditions"""
-        print("\n=== Error Handling Tests ===")
+        self.print_header("Error Handling Tests")
         
         # Test invalid JSON
         try:
-            response = self.session.post(f"{self.base_url}/identities", 
-                                       data="{invalid json}", 
-                                       headers={'Content-Type': 'application/json'})
+            response = self._current_session().post(f"{self.base_url}/identities", 
+                                                 data="{invalid json}", 
+                                                 headers={'Content-Type': 'application/json'})
             if response.status_code == 400:
                 self.log_test("Invalid JSON", True, "Correctly rejected invalid JSON")
             else:
@@ -199,14 +239,50 @@ class AgentMessageAPITester:
         else:
             self.log_test("Missing Required Fields", False, f"Expected 400, got {status}")
             
+    def seed_identities(self, count: int, prefix: str):
+        """Load count extra identities directly into PostgreSQL with one COPY
+        
+        Bypasses the HTTP API (one streamed command instead of count POSTs), so the
+        REMOTE_DB_* settings must point at the API service's database. The API may serve
+        a cached identity list for a few seconds before the seeded rows show up.
+        """
+        self.print_header(f"Seed Identities ({count})")
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from database import RemoteDatabase
+        
+        self.seed_db = RemoteDatabase()
+        dids = [f"{prefix}_{i}" for i in range(count)]
+        result = self.seed_db.copy_identities(
+            {
+                "did": did,
+                "name": f"Seed Agent {i}",
+                "description": "Seeded identity for API testing",
+                "capabilities": ["chat"]
+            }
+            for i, did in enumerate(dids)
+        )
+        if result['status'] == 'success':
+            self.seeded_dids.extend(dids)
+            self.log_test("Seed Identities (COPY)", True, result['message'])
+        else:
+            self.log_test("Seed Identities (COPY)", False, result['message'])
+            
     def cleanup_test_data(self):
         """Clean up any remaining test data"""
-        print("\n=== Cleanup ===")
+        self.print_header("Cleanup")
         for did in self.test_dids.copy():
             self.test_delete_identity(did)
+        if self.seed_db is not None:
+            failed = [did for did in self.seeded_dids
+                      if self.seed_db.delete_identity(did)['status'] != 'success']
+            self.log_test("Delete Seeded Identities", not failed,
+                          f"{len(self.seeded_dids) - len(failed)} of {len(self.seeded_dids)} deleted")
+            self.seeded_dids = []
+            self.seed_db.close()
+            self.seed_db = None
             
-    def run_full_test_suite(self):
-        """Run the complete test suite"""
+    def run_full_test_suite(self, seed_count: int = 0):
+        """Run the complete test suite, optionally on top of seed_count COPY-loaded identities"""
         print("=== AgentMessage Remote API Test Suite ===")
         print(f"API Base URL: {self.base_url}")
         print(f"Test started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -217,28 +293,39 @@ class AgentMessageAPITester:
         test_did_2 = f"did:test:agent_{timestamp}_2"
         
         try:
-            # Basic functionality tests
-            self.test_health_check()
-            self.test_list_empty_identities()
+            if seed_count > 0:
+                self.seed_identities(seed_count, f"did:test:seed_{timestamp}")
             
-            # CRUD operations
-            print("\n=== CRUD Operations Tests ===")
-            self.test_create_identity(
-                test_did_1, 
-                "Test Agent 1", 
-                "A test agent for API testing",
-                ["chat", "code", "search"]
+            # Basic functionality and error handling tests (none of them creates an
+            # identity, so they run together before the CRUD tests)
+            self.run_concurrently(
+                self.test_health_check,
+                self.test_list_empty_identities,
+                self.test_error_handling
             )
             
-            self.test_create_identity(
-                test_did_2,
-                "Test Agent 2", 
-                "Another test agent for API testing",
-                ["analysis", "translation"]
+            # CRUD operations; the two identities are independent of each other, and the
+            # lookups only need the creates to have finished
+            self.print_header("CRUD Operations Tests")
+            self.run_concurrently(
+                lambda: self.test_create_identity(
+                    test_did_1, 
+                    "Test Agent 1", 
+                    "A test agent for API testing",
+                    ["chat", "code", "search"]
+                ),
+                lambda: self.test_create_identity(
+                    test_did_2,
+                    "Test Agent 2", 
+                    "Another test agent for API testing",
+                    ["analysis", "translation"]
+                )
             )
             
-            self.test_get_identity(test_did_1, should_exist=True)
-            self.test_get_identity("did:test:nonexistent", should_exist=False)
+            self.run_concurrently(
+                lambda: self.test_get_identity(test_did_1, should_exist=True),
+                lambda: self.test_get_identity("did:test:nonexistent", should_exist=False)
+            )
             
             # Update test
             updated_data = {
@@ -253,19 +340,16 @@ class AgentMessageAPITester:
             # Pagination tests
             self.test_list_identities_with_pagination()
             
-            # Error handling tests
-            self.test_error_handling()
-            
         finally:
             # Always cleanup
             self.cleanup_test_data()
             
         # Print summary
-        self.print_test_summary()
+        return self.print_test_summary()
         
     def print_test_summary(self):
         """Print test results summary"""
-        print("\n=== Test Summary ===")
+        self.print_header("Test Summary")
         total_tests = len(self.test_results)
         passed_tests = sum(1 for _, success, _ in self.test_results if success)
         failed_tests = total_tests - passed_tests
@@ -296,6 +380,9 @@ def main():
                        help='Verify SSL certificates (default: False for self-signed certs)')
     parser.add_argument('--quick', action='store_true', 
                        help='Run quick tests only')
+    parser.add_argument('--seed', type=int, default=0, metavar='N',
+                       help='Load N extra identities via COPY before the full suite '
+                            '(needs REMOTE_DB_* access to the API database)')
     
     args = parser.parse_args()
     
@@ -303,12 +390,11 @@ def main():
     
     if args.quick:
         # Quick tests
-        tester.test_health_check()
-        tester.test_list_empty_identities()
+        tester.run_concurrently(tester.test_health_check, tester.test_list_empty_identities)
         success = len([r for r in tester.test_results if not r[1]]) == 0
     else:
         # Full test suite
-        success = tester.run_full_test_suite()
+        success = tester.run_full_test_suite(seed_count=args.seed)
     
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,7 @@
+"""pytest setup for the remote server tests: the service modules import each other as top-level
+modules (from config import ...), as they do when run from remote_server/"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,123 @@
+"""Tests for RemoteDatabase.get_identities against a real PostgreSQL server
+
+They use the REMOTE_DB_* settings and are skipped unless REMOTE_DB_TEST=true; every identity they
+create carries a capability unique to the run and is deleted afterwards, so existing rows do not
+affect the results.
+"""
+
+import os
+import uuid
+from contextlib import contextmanager
+
+import psycopg2.extensions
+import pytest
+
+from database import RemoteDatabase, STREAM_BATCH_SIZE
+
+IDENTITY_COUNT = 7
+
+pytestmark = pytest.mark.skipif(
+    os.getenv('REMOTE_DB_TEST', 'false').lower() != 'true',
+    reason='set REMOTE_DB_TEST=true and REMOTE_DB_* to run against PostgreSQL'
+)
+
+
+@pytest.fixture(scope='module')
+def remote_db():
+    db = RemoteDatabase()
+    assert db.create_tables()['status'] == 'success'
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def tag(remote_db):
+    """Capability shared only by the IDENTITY_COUNT identities created for one test"""
+    tag = f'test-{uuid.uuid4().hex}'
+    dids = [f'did:test:{tag}:{i}' for i in range(IDENTITY_COUNT)]
+    for i, did in enumerate(dids):
+        result = remote_db.insert_identity({
+            'did': did, 'name': f'Agent {i}', 'description': 'get_identities test',
+            'capabilities': ['chat', tag]
+        })
+        assert result['status'] == 'success'
+    yield tag
+    for did in dids:
+        remote_db.delete_identity(did)
+
+
+@pytest.fixture
+def executed(remote_db, monkeypatch):
+    """SQL statements executed by get_identities, in order"""
+    statements = []
+
+    class RecordingCursor(psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            statements.append(query)
+            return super().execute(query, vars)
+
+    get_connection = remote_db.get_connection
+
+    @contextmanager
+    def recording_connection():
+        with get_connection() as conn:
+            conn.cursor_factory = RecordingCursor
+            try:
+                yield conn
+            finally:
+                conn.cursor_factory = psycopg2.extensions.cursor
+
+    monkeypatch.setattr(remote_db, 'get_connection', recording_connection)
+    return statements
+
+
+def test_offset_page_counts_with_window(remote_db, tag, executed):
+    result = remote_db.get_identities(limit=3, offset=2, capability=tag)
+    assert result['status'] == 'success'
+    assert (result['count'], result['total']) == (3, IDENTITY_COUNT)
+    assert len(executed) == 1 and 'OVER ()' in executed[0]
+
+
+def test_last_offset_page_needs_no_count(remote_db, tag, executed):
+    result = remote_db.get_identities(limit=5, offset=5, capability=tag)
+    assert (result['count'], result['total']) == (2, IDENTITY_COUNT)
+    assert result['next_cursor'] is None
+    assert len(executed) == 1
+
+
+def test_offset_past_end_counts_separately(remote_db, tag, executed):
+    result = remote_db.get_identities(limit=3, offset=IDENTITY_COUNT + 1, capability=tag)
+    assert (result['count'], result['total']) == (0, IDENTITY_COUNT)
+    assert 'COUNT(*) FROM identity_capabilities' in executed[-1]
+
+
+def test_keyset_pages_walk_the_listing_without_window(remote_db, tag, executed):
+    expected = [identity['did'] for identity in remote_db.get_identities(capability=tag)['identities']]
+    executed.clear()
+
+    seen = []
+    after = None
+    while True:
+        result = remote_db.get_identities(limit=3, after=after, capability=tag)
+        assert result['total'] == IDENTITY_COUNT
+        seen.extend(identity['did'] for identity in result['identities'])
+        after = result['next_cursor']
+        if after is None:
+            break
+    assert seen == expected
+
+    # The first page has no cursor yet and is an ordinary offset page
+    keyset_queries = [query for query in executed if '(updated_at, did) <' in query]
+    assert keyset_queries and not any('OVER ()' in query for query in keyset_queries)
+
+
+def test_streamed_listing_has_no_window_or_count(remote_db, tag, executed):
+    result = remote_db.get_identities(capability=tag)
+    assert (result['count'], result['total']) == (IDENTITY_COUNT, IDENTITY_COUNT)
+    updated = [identity['updated_at'] for identity in result['identities']]
+    assert updated == sorted(updated, reverse=True)
+
+    result = remote_db.get_identities(limit=STREAM_BATCH_SIZE + 1, capability=tag)
+    assert result['total'] == IDENTITY_COUNT
+
+    assert not any('OVER ()' in query or 'COUNT(*)' in query for query in executed)
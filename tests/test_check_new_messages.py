@@ -0,0 +1,75 @@
+"""Tests for the DID -> name cache used when polling for new messages"""
+
+import sqlite3
+import sys
+import threading
+
+from message import check_new_messages, pool
+
+NAMES = {f"did:test:{i}": f"Agent {i}" for i in range(50)}
+
+
+def _identities_db(tmp_path):
+    path = tmp_path / "identities.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE identities (did TEXT PRIMARY KEY, name TEXT NOT NULL)")
+    conn.executemany("INSERT INTO identities VALUES (?, ?)", NAMES.items())
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_names_for_is_safe_across_threads(tmp_path, monkeypatch):
+    path = _identities_db(tmp_path)
+    # Entries expire at once and the cache, padded with live entries for another database, is pruned
+    # on every lookup: threads keep iterating over a large dict while others insert into it
+    monkeypatch.setattr(check_new_messages, "_NAME_TTL", 0.0)
+    monkeypatch.setattr(check_new_messages, "_NAME_CACHE_MAX", 0)
+    monkeypatch.setattr(
+        check_new_messages, "_NAME_CACHE", {("other.db", f"did:other:{i}"): (None, float("inf")) for i in range(20000)}
+    )
+    monkeypatch.setattr(check_new_messages, "_NAME_CACHE_SIGNATURES", {})
+
+    dids = list(NAMES) + ["did:test:unknown"]
+    errors = []
+
+    def poll(offset):
+        try:
+            for i in range(50):
+                batch = [dids[(offset + i + k) % len(dids)] for k in range(5)]
+                expected = {did: NAMES[did] for did in batch if did in NAMES}
+                assert check_new_messages._names_for(path, batch) == expected
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=poll, args=(n * 7,)) for n in range(8)]
+    # Switch threads as often as possible so unguarded dict iteration would be interrupted
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+        pool.close_all()
+    assert errors == []
+
+
+def test_names_for_drops_entries_when_identities_db_changes(tmp_path, monkeypatch):
+    path = _identities_db(tmp_path)
+    monkeypatch.setattr(check_new_messages, "_NAME_CACHE", {})
+    monkeypatch.setattr(check_new_messages, "_NAME_CACHE_SIGNATURES", {})
+    try:
+        assert check_new_messages._names_for(path, ["did:test:1"]) == {"did:test:1": "Agent 1"}
+
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE identities SET name = 'Renamed' WHERE did = 'did:test:1'")
+        conn.execute("INSERT INTO identities VALUES ('did:test:new', 'New Agent with a longer name')")
+        conn.commit()
+        conn.close()
+
+        assert check_new_messages._names_for(path, ["did:test:1"]) == {"did:test:1": "Renamed"}
+    finally:
+        pool.close_all()
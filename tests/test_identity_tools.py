@@ -0,0 +1,61 @@
+"""Tests for publishing identities with identity.tools
+
+The discovered_globally tests use the REMOTE_DB_* settings and are skipped unless REMOTE_DB_TEST=true.
+"""
+
+import os
+
+import pytest
+
+from identity import tools
+from message import pool
+
+remote_db = pytest.mark.skipif(
+    os.getenv("REMOTE_DB_TEST", "false").lower() != "true",
+    reason="set REMOTE_DB_TEST=true and REMOTE_DB_* to run against PostgreSQL",
+)
+
+
+@pytest.fixture
+def registered(tmp_path, monkeypatch):
+    """DID of an identity registered in a fresh AGENTMESSAGE_MEMORY_PATH"""
+    monkeypatch.setenv("AGENTMESSAGE_MEMORY_PATH", str(tmp_path / "memory"))
+    monkeypatch.setenv("AGENTMESSAGE_PUBLIC_DATABLOCKS", str(tmp_path / "public"))
+    result = tools.register_recall_id("tester", "identity tools test", ["chat"])
+    assert result["status"] == "success"
+    yield result["identity"]["did"]
+    pool.close_all()
+
+
+def test_register_recall_id_returns_a_fresh_identity_dict(registered):
+    first = tools.register_recall_id()
+    assert first["status"] == "success"
+    assert list(first["identity"]) == ["name", "description", "capabilities", "did", "created_at", "updated_at"]
+    assert first["identity"]["did"] == registered
+
+    first["identity"]["name"] = "changed by the caller"
+    assert tools.register_recall_id()["identity"]["name"] == "tester"
+
+
+@remote_db
+def test_discovered_globally_keeps_credentials_out_of_schema_cache(registered):
+    import psycopg2
+
+    tools._remote_db_config.cache_clear()
+    host, port, dbname, user, password, sslmode = tools._remote_db_config()
+    try:
+        result = tools.discovered_globally()
+        assert result["status"] == "success", result
+        assert (host, port, dbname) in tools._PG_SCHEMA_READY
+        assert not any("password=" in str(key) for key in tools._PG_SCHEMA_READY | tools._SCHEMA_READY)
+        # Only identities.db paths go into the SQLite schema cache
+        assert all(isinstance(key, str) and key.endswith(".db") for key in tools._SCHEMA_READY)
+
+        # A second publish skips the DDL and still succeeds
+        assert tools.discovered_globally()["status"] == "success"
+    finally:
+        tools._close_pg_pool()
+        conn = psycopg2.connect(host=host, port=port, dbname=dbname, user=user, password=password, sslmode=sslmode)
+        with conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM identities WHERE did = %s", (registered,))
+        conn.close()
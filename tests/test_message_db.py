@@ -0,0 +1,292 @@
+"""Tests for the message_history schema migration, mark_read and the coalescing writer"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from message import db, pool, writer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BEIJING = timezone(timedelta(hours=8))
+
+# message_history as created by the first released version: rowid table, no timestamp_ms
+BASELINE_SCHEMA = """
+    CREATE TABLE message_history (
+        message_id   TEXT PRIMARY KEY,
+        timestamp    TEXT NOT NULL,
+        sender_did   TEXT NOT NULL,
+        receiver_dids TEXT NOT NULL, -- JSON array string
+        group_id     TEXT NOT NULL,
+        message_data  TEXT NOT NULL, -- JSON object string
+        mention_dids  TEXT NOT NULL, -- JSON array string
+        read_status   TEXT NOT NULL DEFAULT '{}' -- JSON object string; record read status for each receiver
+    );
+    CREATE INDEX message_history_group_id_idx ON message_history(group_id);
+    CREATE INDEX message_history_sender_did_idx ON message_history(sender_did);
+    CREATE INDEX message_history_timestamp_idx ON message_history(timestamp);
+"""
+
+# Rows as the baseline wrote them (json.dumps with its default separators)
+BASELINE_ROWS = [
+    (
+        "m1", "2025-01-02 03:04:05", "did:a", json.dumps(["did:b", "did:c"]), "g1",
+        json.dumps({"text": "hello"}), json.dumps(["did:b"]), json.dumps({"did:b": True, "did:c": False}),
+    ),
+    (
+        "m2", "2025-01-02 03:05:00", "did:b", json.dumps(["did:a"]), "g1",
+        json.dumps({"text": "hi"}), json.dumps([]), json.dumps({"did:a": False}),
+    ),
+]
+
+
+def _epoch_ms(timestamp: str) -> int:
+    return int(datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").replace(tzinfo=BEIJING).timestamp() * 1000)
+
+
+def _new_row(message_id: str, receivers: list, timestamp: str = "2025-01-03 10:00:00") -> tuple:
+    """Row in insert_messages() layout"""
+    return (
+        message_id, timestamp, "did:a", json.dumps(receivers), "g2",
+        json.dumps({"text": message_id}), json.dumps([]), _epoch_ms(timestamp),
+    )
+
+
+def _baseline_db(data_dir, rows):
+    """Write a baseline-schema message_history.db holding rows into data_dir and return its path"""
+    path = data_dir / "message_history.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO message_history VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENTMESSAGE_PUBLIC_DATABLOCKS", str(tmp_path))
+    yield tmp_path
+    pool.close_all()
+
+
+@pytest.fixture
+def db_path(data_dir):
+    """A baseline-schema message_history.db holding BASELINE_ROWS, migrated by init_message_history_db"""
+    path = _baseline_db(data_dir, BASELINE_ROWS)
+    assert db.init_message_history_db() == path
+    return path
+
+
+def _recipients(path) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT message_id, did, read, group_id, timestamp_ms FROM message_recipients"
+        ).fetchall()
+    finally:
+        conn.close()
+    return {(message_id, did): rest for message_id, did, *rest in rows}
+
+
+def test_migration_preserves_rows_and_fills_new_columns(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT {db._MESSAGE_COLUMNS}, timestamp_ms FROM message_history ORDER BY message_id"
+        ).fetchall()
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == db._DATA_VERSION
+    finally:
+        conn.close()
+
+    assert len(rows) == len(BASELINE_ROWS)
+    for row, original in zip(rows, BASELINE_ROWS):
+        assert row[:3] == original[:3]
+        assert row[4] == original[4]
+        # JSON columns are minified but keep their values
+        for index in (3, 5, 6, 7):
+            assert json.loads(row[index]) == json.loads(original[index])
+        assert row[8] == _epoch_ms(original[1])
+
+    assert _recipients(db_path) == {
+        ("m1", "did:b"): [1, "g1", _epoch_ms("2025-01-02 03:04:05")],
+        ("m1", "did:c"): [0, "g1", _epoch_ms("2025-01-02 03:04:05")],
+        ("m2", "did:a"): [0, "g1", _epoch_ms("2025-01-02 03:05:00")],
+    }
+
+
+def test_concurrent_first_init_migrates_once(data_dir):
+    # Enough rows that the migration takes a while, so the processes overlap inside it
+    rows = [
+        (f"x{i}", "2025-01-02 03:04:05", "did:a", '["did:b", "did:c"]', "g1", '{"text": "hi"}', "[]", "{}")
+        for i in range(20000)
+    ]
+    path = _baseline_db(data_dir, rows)
+    env = dict(os.environ, AGENTMESSAGE_PUBLIC_DATABLOCKS=str(data_dir))
+    script = "from message.db import init_message_history_db; init_message_history_db()"
+    processes = [
+        subprocess.Popen([sys.executable, "-c", script], cwd=REPO_ROOT, env=env, stderr=subprocess.PIPE, text=True)
+        for _ in range(4)
+    ]
+    errors = [process.communicate()[1] for process in processes if process.wait() != 0]
+    assert errors == []
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM message_history").fetchone()[0] == len(rows)
+        assert conn.execute("SELECT COUNT(*) FROM message_recipients").fetchone()[0] == 2 * len(rows)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == db._DATA_VERSION
+    finally:
+        conn.close()
+
+
+def test_insert_without_timestamp_ms_is_filled(db_path):
+    # A client that predates timestamp_ms writes only the baseline columns
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(
+            f"INSERT INTO message_history ({db._MESSAGE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ("m3", "2025-01-02 04:00:00", "did:a", '["did:b"]', "g1", '{"text":"x"}', "[]", '{"did:b":false}'),
+        )
+        conn.commit()
+        timestamp_ms = conn.execute("SELECT timestamp_ms FROM message_history WHERE message_id = 'm3'").fetchone()[0]
+    finally:
+        conn.close()
+
+    assert timestamp_ms == _epoch_ms("2025-01-02 04:00:00")
+    assert _recipients(db_path)[("m3", "did:b")] == [0, "g1", timestamp_ms]
+
+
+def test_migration_survives_malformed_timestamp(data_dir):
+    bad_row = ("m9", "not a timestamp", "did:a", '["did:b"]', "g1", '{"text":"x"}', "[]", '{"did:b":false}')
+    path = _baseline_db(data_dir, BASELINE_ROWS + [bad_row])
+    assert db.init_message_history_db() == path
+
+    conn = sqlite3.connect(path)
+    try:
+        timestamps = dict(conn.execute("SELECT message_id, timestamp_ms FROM message_history").fetchall())
+    finally:
+        conn.close()
+    assert timestamps == {"m1": _epoch_ms(BASELINE_ROWS[0][1]), "m2": _epoch_ms(BASELINE_ROWS[1][1]), "m9": 0}
+    assert _recipients(path)[("m9", "did:b")] == [0, "g1", 0]
+
+    # Later runs (a fresh process) open it again without failing
+    db._DB_READY.clear()
+    assert db.init_message_history_db() == path
+
+
+def test_mark_read_updates_both_tables(db_path):
+    with pool.get_rw(db_path) as conn:
+        db.mark_read(conn, ["m1", "m2"], "did:c")
+        db.mark_read(conn, ["m2"], "did:a")
+        conn.commit()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        status = dict(conn.execute("SELECT message_id, read_status FROM message_history").fetchall())
+    finally:
+        conn.close()
+    assert json.loads(status["m1"]) == {"did:b": True, "did:c": True}
+    # did:c is not a receiver of m2, so only did:a changes there
+    assert json.loads(status["m2"]) == {"did:a": True, "did:c": True}
+
+    recipients = _recipients(db_path)
+    assert recipients[("m1", "did:c")][0] == 1
+    assert recipients[("m2", "did:a")][0] == 1
+    assert ("m2", "did:c") not in recipients
+
+
+def test_direct_read_status_update_syncs_recipients(db_path):
+    # Older clients mark messages read by rewriting read_status themselves
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(
+            "UPDATE message_history SET read_status = ? WHERE message_id = ?",
+            (json.dumps({"did:b": True, "did:c": True}), "m1"),
+        )
+        conn.execute(
+            "UPDATE message_history SET read_status = ? WHERE message_id = ?", (json.dumps({"did:a": True}), "m2")
+        )
+        conn.commit()
+        assert _recipients(db_path)[("m1", "did:c")][0] == 1
+        assert _recipients(db_path)[("m2", "did:a")][0] == 1
+
+        conn.execute(
+            "UPDATE message_history SET read_status = ? WHERE message_id = ?", (json.dumps({"did:a": False}), "m2")
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    assert _recipients(db_path)[("m2", "did:a")][0] == 0
+
+
+def test_migration_repairs_read_flags_missed_before_the_update_trigger(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("DROP TRIGGER message_history_read_status_update")
+        conn.execute("UPDATE message_history SET read_status = ? WHERE message_id = 'm2'", (json.dumps({"did:a": True}),))
+        conn.execute("PRAGMA user_version = 3")
+        conn.commit()
+    finally:
+        conn.close()
+    assert _recipients(db_path)[("m2", "did:a")][0] == 0
+
+    db._DB_READY.clear()
+    db.init_message_history_db()
+    recipients = _recipients(db_path)
+    assert recipients[("m2", "did:a")][0] == 1
+    assert recipients[("m1", "did:c")][0] == 0
+
+
+def test_writer_batch_with_bad_row_writes_the_others(db_path):
+    # The middle row reuses an existing message_id; all three are queued before the flusher runs
+    rows = [_new_row("n1", ["did:b"]), _new_row("m1", ["did:c"]), _new_row("n2", ["did:b", "did:c"])]
+
+    async def send_all():
+        return await asyncio.gather(
+            *(writer.insert_message(db_path, row) for row in rows), return_exceptions=True
+        )
+
+    results = asyncio.run(send_all())
+    assert results[0] is None
+    assert isinstance(results[1], sqlite3.IntegrityError)
+    assert results[2] is None
+
+    conn = sqlite3.connect(db_path)
+    try:
+        sender = dict(conn.execute("SELECT message_id, sender_did FROM message_history").fetchall())
+        receivers = conn.execute("SELECT receiver_dids FROM message_history WHERE message_id = 'm1'").fetchone()[0]
+    finally:
+        conn.close()
+    assert set(sender) == {"m1", "m2", "n1", "n2"}
+    # The original m1 is untouched
+    assert json.loads(receivers) == ["did:b", "did:c"]
+
+    recipients = _recipients(db_path)
+    assert recipients[("n1", "did:b")] == [0, "g2", rows[0][7]]
+    assert ("n2", "did:b") in recipients and ("n2", "did:c") in recipients
+
+
+def test_writer_wakes_group_and_receiver_subscribers(db_path):
+    async def send_and_wait():
+        group = pool.subscribe("g2")
+        receiver = pool.subscribe("did:c")
+        bystander = pool.subscribe("did:z")
+        try:
+            await writer.insert_message(db_path, _new_row("n3", ["did:b", "did:c"]))
+            await asyncio.wait_for(group.wait(), 1)
+            await asyncio.wait_for(receiver.wait(), 1)
+            # Give a stray wake-up the chance to run before checking it did not happen
+            await asyncio.sleep(0)
+            return bystander.is_set()
+        finally:
+            for key, event in (("g2", group), ("did:c", receiver), ("did:z", bystander)):
+                pool.unsubscribe(key, event)
+
+    assert asyncio.run(send_and_wait()) is False